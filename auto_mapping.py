@@ -8,17 +8,16 @@ import sys
 from dotenv import load_dotenv
 from src.database_updater import DatabaseUpdater
 from src.grandline_client import GrandLineClient
+from src.code_matcher import CodeMatcher
+from src.mapping_runner import run_sharded
+from src.mapping_state import MappingState, load_mappings, scope_condition, stored_score
+from config import Config
 import logging
-from difflib import SequenceMatcher
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def similarity(a, b):
-    """Вычисляет схожесть двух строк"""
-    return SequenceMatcher(None, a, b).ratio()
-
 def find_best_matches(grandline_codes, opencart_codes, min_similarity=0.6):
     """
     Находит лучшие совпадения между кодами
@@ -29,57 +28,43 @@ def find_best_matches(grandline_codes, opencart_codes, min_similarity=0.6):
         min_similarity: минимальная схожесть для считания совпадением
     
     Returns:
-        dict: {grandline_code: opencart_code}
+        dict: {grandline_code: {'opencart_code', 'similarity', 'method'}}
     """
-    matches = {}
+    # Индекс по кодам OpenCart строится один раз, дальше каждый код GrandLine
+    # сравнивается только с кандидатами из индекса, а не со всем каталогом.
+    # Коды GrandLine делятся между процессами (MAPPING_WORKERS)
+    matcher = CodeMatcher(opencart_codes)
+    results = run_sharded(matcher, grandline_codes, min_similarity)
     
-    for gl_code in grandline_codes:
-        best_match = None
-        best_score = 0
-        
-        for oc_code in opencart_codes:
-            # 1. Проверяем точное совпадение
-            if gl_code == oc_code:
-                best_match = oc_code
-                best_score = 1.0
-                break
-            
-            # 2. Проверяем совпадение окончаний (последние 4-6 цифр)
-            if len(gl_code) >= 4 and len(oc_code) >= 4:
-                gl_suffix = gl_code[-4:]
-                oc_suffix = oc_code[-4:]
-                if gl_suffix == oc_suffix:
-                    score = 0.8  # Высокий приоритет для совпадения окончаний
-                    if score > best_score:
-                        best_match = oc_code
-                        best_score = score
-            
-            # 3. Проверяем совпадение начал
-            if len(gl_code) >= 3 and len(oc_code) >= 3:
-                gl_prefix = gl_code[:3]
-                oc_prefix = oc_code[:3]
-                if gl_prefix == oc_prefix:
-                    score = 0.7
-                    if score > best_score:
-                        best_match = oc_code
-                        best_score = score
-            
-            # 4. Общая схожесть строк
-            score = similarity(gl_code, oc_code)
-            if score > best_score and score >= min_similarity:
-                best_match = oc_code
-                best_score = score
-        
-        if best_match and best_score >= min_similarity:
-            matches[gl_code] = {
-                'opencart_code': best_match,
-                'similarity': best_score,
-                'method': 'exact' if best_score == 1.0 else 
-                         'suffix' if best_score == 0.8 else
-                         'prefix' if best_score == 0.7 else 'similarity'
-            }
-    
-    return matches
+    return {gl_code: match for gl_code, match in zip(grandline_codes, results) if match}
+
+def find_incremental_matches(grandline_codes, opencart_codes, plan, mappings, min_similarity=0.6):
+    """
+    Сопоставляет только то, что изменилось с прошлого запуска
+    
+    Коды GrandLine из плана (новые и потерявшие свой товар OpenCart) сравниваются со
+    всем каталогом, остальные - только с новыми кодами OpenCart, и их соответствие
+    меняется, лишь если новое совпадение лучше сохраненного.
+    
+    Returns:
+        tuple: (совпадения {grandline_code: {...}}, коды GrandLine, чьи сохраненные
+        соответствия нужно удалить)
+    """
+    rescore, changed_opencart, removed_grandline = plan
+    full = [code for code in grandline_codes if code in rescore]
+    rest = [code for code in grandline_codes if code not in rescore]
+    new_codes = [code for code in opencart_codes if code in changed_opencart]
+    
+    matches = find_best_matches(full, opencart_codes, min_similarity) if full else {}
+    if rest and new_codes:
+        for gl_code, match in find_best_matches(rest, new_codes, min_similarity).items():
+            if stored_score(match['similarity']) > mappings.get(gl_code, (None, 0))[1]:
+                matches[gl_code] = match
+    
+    # Пересчитанные коды без уверенного совпадения и пропавшие из GrandLine теряют старые соответствия
+    stale = {code for code in rescore if code in mappings and matches.get(code, {}).get('similarity', 0) < 0.8}
+    stale.update(code for code in removed_grandline if code in mappings)
+    return matches, stale
 
 def auto_mapping():
     """Автоматическое сопоставление кодов"""
@@ -100,13 +85,12 @@ def auto_mapping():
         
         print(f"Получено {len(prices)} позиций из GrandLine")
         
-        # Получаем первые 1000 для тестирования
-        test_nomenclature_ids = [item['nomenclature_id'] for item in prices[:1000]]
-        nomenclatures = grandline_client.get_nomenclatures(test_nomenclature_ids)
+        nomenclature_ids = [item['nomenclature_id'] for item in prices]
+        nomenclatures = grandline_client.get_nomenclatures(nomenclature_ids)
         
         grandline_codes = list(nomenclatures.values())
         print(f"Получено {len(grandline_codes)} кодов из GrandLine для анализа")
-        
+    
     except Exception as e:
         print(f"❌ Ошибка получения данных из GrandLine: {e}")
         return False
@@ -123,14 +107,32 @@ def auto_mapping():
         cursor.execute("SELECT model FROM oc_product WHERE model IS NOT NULL AND model != ''")
         opencart_codes = [row[0] for row in cursor.fetchall()]
         print(f"Получено {len(opencart_codes)} кодов из OpenCart")
-        
+    
     except Exception as e:
         print(f"❌ Ошибка получения кодов из OpenCart: {e}")
         return False
     
     # 3. Автоматическое сопоставление
-    print("\n3. Поиск совпадений...")
-    matches = find_best_matches(grandline_codes, opencart_codes, min_similarity=0.6)
+    state = MappingState('codes')
+    grandline_fingerprints = {code: MappingState.fingerprint(code) for code in grandline_codes}
+    opencart_fingerprints = {code: MappingState.fingerprint(code) for code in opencart_codes}
+    
+    plan = None
+    mappings = {}
+    if Config.MAPPING_INCREMENTAL and '--full' not in sys.argv and not state.is_empty():
+        try:
+            mappings = load_mappings(cursor, 'codes')
+            plan = state.plan(grandline_fingerprints, opencart_fingerprints, mappings)
+        except Exception as e:
+            print(f"⚠️  Не удалось загрузить сохраненные соответствия, полный пересчет: {e}")
+    
+    if plan:
+        print("\n3. Поиск совпадений для новых и изменившихся кодов...")
+        matches, stale_codes = find_incremental_matches(grandline_codes, opencart_codes, plan, mappings, min_similarity=0.6)
+    else:
+        print("\n3. Поиск совпадений...")
+        matches = find_best_matches(grandline_codes, opencart_codes, min_similarity=0.6)
+        stale_codes = set()
     
     print(f"Найдено {len(matches)} потенциальных совпадений")
     
@@ -176,17 +178,29 @@ def auto_mapping():
             )
         """)
         
-        # Очищаем старые данные
-        cursor.execute("DELETE FROM oc_grandline_mapping")
+        # При полном пересчете очищаем старые данные, при инкрементальном удаляем только устаревшие
+        if plan:
+            cursor.executemany(
+                f"DELETE FROM oc_grandline_mapping WHERE grandline_code = %s AND {scope_condition('codes')}",
+                [(gl_code,) for gl_code in stale_codes]
+            )
+        else:
+            cursor.execute(f"DELETE FROM oc_grandline_mapping WHERE {scope_condition('codes')}")
         
-        # Вставляем новые соответствия
+        # Вставляем новые соответствия; строки сопоставления по названиям не перезаписываются.
+        # mapping_method обновляется последним: условия выше видят его старое значение
         high_confidence_matches = {k: v for k, v in matches.items() if v['similarity'] >= 0.8}
+        own_row = scope_condition('codes')
         
         for gl_code, match_info in high_confidence_matches.items():
-            cursor.execute("""
+            cursor.execute(f"""
                 INSERT INTO oc_grandline_mapping 
                 (grandline_code, opencart_model, similarity_score, mapping_method) 
                 VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    opencart_model = IF({own_row}, VALUES(opencart_model), opencart_model),
+                    similarity_score = IF({own_row}, VALUES(similarity_score), similarity_score),
+                    mapping_method = IF({own_row}, VALUES(mapping_method), mapping_method)
             """, (
                 gl_code,
                 match_info['opencart_code'],
@@ -195,15 +209,27 @@ def auto_mapping():
             ))
         
         db_updater.connection.commit()
-        print(f"✅ Создано {len(high_confidence_matches)} соответствий с высокой уверенностью (≥80%)")
-        
+        state.save(grandline_fingerprints, opencart_fingerprints)
+        if plan:
+            print(f"✅ Обновлено {len(high_confidence_matches)} соответствий с высокой уверенностью (≥80%), "
+                  f"удалено устаревших: {len(stale_codes)}")
+        else:
+            print(f"✅ Создано {len(high_confidence_matches)} соответствий с высокой уверенностью (≥80%)")
+    
     except Exception as e:
         print(f"❌ Ошибка создания таблицы соответствий: {e}")
         return False
+    finally:
+        state.close()
     
     # 7. Статистика покрытия
     total_gl_codes = len(grandline_codes)
-    mapped_codes = len(high_confidence_matches)
+    if plan:
+        # Сохраненные соответствия, оставшиеся после удаления устаревших, плюс обновленные
+        mapped = (set(mappings) - stale_codes) | set(high_confidence_matches)
+        mapped_codes = len(mapped & set(grandline_codes))
+    else:
+        mapped_codes = len(high_confidence_matches)
     coverage = (mapped_codes / total_gl_codes) * 100 if total_gl_codes > 0 else 0
     
     print(f"\n=== РЕЗУЛЬТАТЫ ===")
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Сверка CodeMatcher с полным перебором, который раньше был в auto_mapping.py:
+совпадения со схожестью от CONFIDENT_SIMILARITY (0.8) попадают в
+oc_grandline_mapping и должны совпадать с перебором без исключений - и код
+OpenCart, и оценка. Более слабые совпадения индекс может находить иначе, их
+расхождения только считаются.
+
+Синтетические каталоги: числовые коды, коды вида МП35-1234-R и коды с
+префиксами; коды GrandLine - точные копии, копии с одной замененной цифрой
+и новые коды.
+"""
+
+import os
+import sys
+import time
+import random
+from difflib import SequenceMatcher
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.code_matcher import CodeMatcher
+
+OPENCART_CODES = 3000
+GRANDLINE_CODES = 320
+MIN_SIMILARITY = 0.6
+
+def brute_force(gl_code, opencart_codes, min_similarity):
+    """Цикл прежнего find_best_matches для одного кода"""
+    best_match = None
+    best_score = 0
+    
+    for oc_code in opencart_codes:
+        if gl_code == oc_code:
+            best_match = oc_code
+            best_score = 1.0
+            break
+        
+        if len(gl_code) >= 4 and len(oc_code) >= 4 and gl_code[-4:] == oc_code[-4:]:
+            if 0.8 > best_score:
+                best_match = oc_code
+                best_score = 0.8
+        
+        if len(gl_code) >= 3 and len(oc_code) >= 3 and gl_code[:3] == oc_code[:3]:
+            if 0.7 > best_score:
+                best_match = oc_code
+                best_score = 0.7
+        
+        score = SequenceMatcher(None, gl_code, oc_code).ratio()
+        if score > best_score and score >= min_similarity:
+            best_match = oc_code
+            best_score = score
+    
+    if best_match and best_score >= min_similarity:
+        return best_match, best_score
+    return None
+
+def make_codes(seed):
+    random.seed(seed)
+    digits = '0123456789'
+    
+    def code():
+        kind = random.random()
+        if kind < 0.4:
+            return ''.join(random.choices(digits, k=random.randint(5, 9)))
+        if kind < 0.8:
+            return (f"МП{random.choice(['', '-', '20-', '35-'])}"
+                    f"{''.join(random.choices(digits, k=random.randint(3, 6)))}"
+                    f"{random.choice(['', '-R', '-A', 'x1150'])}")
+        return f"{random.choice(['GL-', 'ТД', '00-'])}{''.join(random.choices(digits, k=random.randint(4, 8)))}"
+    
+    def mutate(source):
+        position = random.randrange(len(source))
+        return source[:position] + random.choice(digits) + source[position + 1:]
+    
+    opencart = [code() for _ in range(OPENCART_CODES)]
+    grandline = []
+    for _ in range(GRANDLINE_CODES):
+        kind = random.random()
+        if kind < 0.2:
+            grandline.append(random.choice(opencart))
+        elif kind < 0.6:
+            grandline.append(mutate(random.choice(opencart)))
+        else:
+            grandline.append(code())
+    return opencart, grandline
+
+def main():
+    threshold = CodeMatcher.CONFIDENT_SIMILARITY
+    print(f"=== CodeMatcher И ПОЛНЫЙ ПЕРЕБОР: {GRANDLINE_CODES} x {OPENCART_CODES} ===\n")
+    print(f"  {'набор':>5} {'перебор, с':>11} {'индекс, с':>10} {'совпадений':>11} "
+          f"{f'от {threshold}':>8} {'расхождений ниже':>17}")
+    
+    for seed in (1, 2, 3):
+        opencart, grandline = make_codes(seed)
+        
+        started = time.perf_counter()
+        expected = [brute_force(code, opencart, MIN_SIMILARITY) for code in grandline]
+        brute_force_time = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        matcher = CodeMatcher(opencart)
+        actual = [
+            (match['opencart_code'], match['similarity']) if match else None
+            for match in matcher.iter_matches(grandline, MIN_SIMILARITY)
+        ]
+        index_time = time.perf_counter() - started
+        
+        confident = 0
+        weaker_differences = 0
+        for code, old, new in zip(grandline, expected, actual):
+            if max(old[1] if old else 0, new[1] if new else 0) >= threshold:
+                assert old == new, f"{code}: перебор {old}, индекс {new}"
+                confident += 1
+            elif old != new:
+                weaker_differences += 1
+        
+        print(f"  {seed:>5} {brute_force_time:11.2f} {index_time:10.2f} "
+              f"{sum(1 for match in expected if match):>11} {confident:>8} {weaker_differences:>17}")
+
+if __name__ == "__main__":
+    main()
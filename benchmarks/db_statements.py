@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк кэша запросов DatabaseUpdater на локальной SQLite вместо MySQL.
+
+Сравнивает прежнюю схему (f-string + .replace('%s', '?') на каждый вызов)
+с текстом запросов, построенным один раз на экземпляр. На MySQL поверх этого
+работают серверные prepared-курсоры, здесь измеряется только клиентская часть.
+"""
+
+import os
+import sys
+import time
+import logging
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.update({
+    'DATABASE_TYPE': 'sqlite',
+    'DATABASE_NAME': ':memory:',
+    'DATABASE_PRODUCTS_TABLE': 'oc_product',
+    'DATABASE_CODE_FIELD': 'model',
+    'DATABASE_PRICE_FIELD': 'price',
+})
+
+from src.database_updater import DatabaseUpdater, logger
+
+ROWS = 20_000
+ROUNDS = 5
+
+def legacy_update(db, code_1c, price):
+    # Прежний update_single_price вместе с его логированием: f-строки логов
+    # вычисляются на каждый вызов и в новой версии, иначе сравнение нечестное
+    cursor = db.connection.cursor()
+    update_fields = [f"{db.price_field} = %s"]
+    values = [float(price), code_1c]
+    sql = f"""
+        UPDATE {db.products_table}
+        SET {', '.join(update_fields)}
+        WHERE {db.code_field} = %s
+    """
+    if db.db_type.lower() == 'sqlite':
+        sql = sql.replace('%s', '?')
+    logger.debug(f"SQL: {sql}")
+    logger.debug(f"Values: {values}")
+    cursor.execute(sql, values)
+    db.connection.commit()
+    logger.info(f"Цена успешно обновлена для {code_1c}: {price}")
+    cursor.close()
+
+def legacy_select(db, code_1c):
+    cursor = db.connection.cursor()
+    sql = f"""
+        SELECT {db.code_field}, {db.price_field}
+        FROM {db.products_table}
+        WHERE {db.code_field} = %s
+    """
+    if db.db_type.lower() == 'sqlite':
+        sql = sql.replace('%s', '?')
+    cursor.execute(sql, (code_1c,))
+    result = cursor.fetchone()
+    columns = [desc[0] for desc in cursor.description]
+    cursor.close()
+    return dict(zip(columns, result))
+
+def compare(old_func, new_func, codes):
+    # Проходы схем чередуются, берется лучший из ROUNDS: разница между схемами
+    # меньше разброса одного прохода
+    timings = {old_func: [], new_func: []}
+    for _ in range(ROUNDS):
+        for func in (old_func, new_func):
+            started = time.perf_counter()
+            for code in codes:
+                func(code)
+            timings[func].append(time.perf_counter() - started)
+    
+    old, new = min(timings[old_func]), min(timings[new_func])
+    for label, elapsed in (("построение SQL на вызов", old), ("кэш запросов", new)):
+        print(f"  {label:<28} {elapsed:8.3f} с  {len(codes) / elapsed:10.0f} оп/с")
+    print(f"  ускорение: x{old / new:.2f}")
+
+def main():
+    logging.disable(logging.WARNING)
+    
+    db = DatabaseUpdater()
+    db.connect()
+    db.connection.execute("CREATE TABLE oc_product (product_id INTEGER PRIMARY KEY, model TEXT, price REAL)")
+    db.connection.execute("CREATE INDEX idx_model ON oc_product (model)")
+    db.connection.executemany(
+        "INSERT INTO oc_product (model, price) VALUES (?, ?)",
+        [(f"{i:06d}", 1.0) for i in range(ROWS)]
+    )
+    db.connection.commit()
+    
+    codes = [f"{i:06d}" for i in range(ROWS)]
+    
+    print(f"=== КЭШ ЗАПРОСОВ: {ROWS} вызовов на SQLite, лучший из {ROUNDS} проходов ===\n")
+    print("UPDATE по одному товару:")
+    compare(lambda c: legacy_update(db, c, 2.0), lambda c: db.update_single_price(c, 3.0), codes)
+    
+    print("\nSELECT по одному товару:")
+    compare(lambda c: legacy_select(db, c), db.get_product_info, codes)
+    
+    db.disconnect()
+
+if __name__ == "__main__":
+    main()
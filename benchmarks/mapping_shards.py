@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк параллельного сопоставления (MAPPING_WORKERS): коды GrandLine делятся
+на диапазоны и сопоставляются с индексом CodeMatcher в пуле процессов, индекс
+передается процессам через fork.
+
+Синтетические каталоги: коды OpenCart и коды GrandLine - часть совпадает точно,
+часть отличается окончанием или несколькими символами.
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.code_matcher import CodeMatcher
+from src.mapping_runner import run_sharded
+
+OPENCART_CODES = 60_000
+GRANDLINE_CODES = 20_000
+
+def make_codes():
+    random.seed(11)
+    alphabet = 'ABCDEFGHKMNPRSTX0123456789'
+    opencart = [
+        f"{random.choice(['GL', 'PR', 'MC', 'SD', 'VD'])}-{''.join(random.choices(alphabet, k=random.randint(6, 10)))}"
+        for _ in range(OPENCART_CODES)
+    ]
+    grandline = []
+    for _ in range(GRANDLINE_CODES):
+        code = random.choice(opencart)
+        kind = random.random()
+        if kind < 0.3:
+            code = code[:-2] + ''.join(random.choices(alphabet, k=2))
+        elif kind < 0.5:
+            position = random.randrange(3, len(code))
+            code = code[:position] + random.choice(alphabet) + code[position + 1:]
+        grandline.append(code)
+    return opencart, grandline
+
+def main():
+    logging.disable(logging.INFO)
+    opencart, grandline = make_codes()
+    matcher = CodeMatcher(opencart)
+    
+    cores = os.cpu_count() or 1
+    print(f"=== СОПОСТАВЛЕНИЕ КОДОВ: {GRANDLINE_CODES} x {OPENCART_CODES}, ядер: {cores} ===\n")
+    print(f"  {'процессов':>9} {'время, с':>10} {'кодов/с':>9} {'ускорение':>10}")
+    
+    baseline = None
+    reference = None
+    for workers in sorted({1, 2, 4, cores}):
+        started = time.perf_counter()
+        results = run_sharded(matcher, grandline, 0.6, workers=workers)
+        elapsed = time.perf_counter() - started
+        
+        baseline = baseline or elapsed
+        reference = reference or results
+        assert results == reference, "результат зависит от числа процессов"
+        
+        print(f"  {workers:>9} {elapsed:10.2f} {GRANDLINE_CODES / elapsed:9.0f} {baseline / elapsed:10.2f}")
+    
+    print(f"\n  найдено совпадений: {sum(1 for result in reference if result)}")
+    if cores == 1:
+        print("  На одном ядре пул процессов не дает выигрыша - запустите на многоядерной машине")
+
+if __name__ == "__main__":
+    main()
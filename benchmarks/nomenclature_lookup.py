@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Микро-бенчмарк отбора номенклатур: проверка членства по списку (как было)
+против хеш-индекса GrandLineClient._match_nomenclatures.
+
+Время на один элемент для индекса должно оставаться постоянным при росте
+каталога (линейный рост общего времени), у списка оно растет пропорционально N.
+"""
+
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.grandline_client import GrandLineClient
+
+def make_catalog(size):
+    items = [{'id_1c': f"id-{i:08d}", 'code_1c': f"{i:06d}"} for i in range(size)]
+    # Запрашиваем половину справочника, как при синхронизации прайса
+    wanted = [item['id_1c'] for item in items[::2]]
+    return items, wanted
+
+def legacy_lookup(items, nomenclature_ids):
+    result = {}
+    for item in items:
+        nomenclature_id = item.get('id_1c')
+        code_1c = item.get('code_1c')
+        if nomenclature_id and code_1c and nomenclature_id in nomenclature_ids:
+            result[nomenclature_id] = code_1c
+    return result
+
+def indexed_lookup(items, nomenclature_ids):
+    result = {}
+    GrandLineClient._match_nomenclatures(items, set(nomenclature_ids), lambda item: item['code_1c'], result)
+    return result
+
+def measure(func, items, wanted, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(items, wanted)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    print("=== ОТБОР НОМЕНКЛАТУР: СПИСОК vs ХЕШ-ИНДЕКС ===\n")
+    print(f"{'N':>8} {'индекс, с':>12} {'мкс/элемент':>12} {'список, с':>12}")
+    
+    for size in (5_000, 10_000, 20_000, 40_000, 80_000):
+        items, wanted = make_catalog(size)
+        
+        assert indexed_lookup(items[:2000], wanted) == legacy_lookup(items[:2000], wanted)
+        
+        indexed = measure(indexed_lookup, items, wanted)
+        
+        # Списочный вариант квадратичен - на больших N его не запускаем
+        if size <= 10_000:
+            legacy = f"{measure(legacy_lookup, items, wanted, repeat=1):12.3f}"
+        else:
+            legacy = f"{'(пропуск)':>12}"
+        
+        print(f"{size:>8} {indexed:12.4f} {indexed / size * 1e6:12.3f} {legacy}")
+
+if __name__ == "__main__":
+    main()
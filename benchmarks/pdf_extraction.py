@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк разбора PDF прайса в пуле процессов (PDF_WORKERS).
+
+Синтетический многостраничный прайс собирается здесь же, без внешних
+библиотек: Type1-шрифт Helvetica с кириллицей через /Differences (имена
+глифов afii*), которые PyPDF2 переводит обратно в Unicode. Кэш страниц
+отключен - измеряется только извлечение текста и разбор строк.
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.pdf_processor import PDFProcessor
+
+PAGES = 400
+LINES_PER_PAGE = 80
+
+LOWER = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+# Кириллица в кодах 128..193: строчные afii10065.., прописные afii10017..
+GLYPHS = [f"afii{10065 + i}" for i in range(len(LOWER))] + [f"afii{10017 + i}" for i in range(len(LOWER))]
+ENCODING = {char: 128 + i for i, char in enumerate(LOWER + LOWER.upper())}
+
+def encode_line(line):
+    encoded = bytearray()
+    for char in line:
+        if char in ENCODING:
+            encoded.append(ENCODING[char])
+        elif char in '()\\':
+            encoded += b'\\' + char.encode('ascii')
+        else:
+            encoded += char.encode('latin-1')
+    return bytes(encoded)
+
+def build_pdf(pages):
+    font = (f"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding << /Type /Encoding "
+            f"/BaseEncoding /WinAnsiEncoding /Differences [128 {' '.join('/' + g for g in GLYPHS)}] >> >>")
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None, font.encode('ascii')]
+    kids = []
+    
+    for lines in pages:
+        stream = b'BT /F1 8 Tf 30 810 Td 9 TL\n' + b''.join(b'(' + encode_line(line) + b") '\n" for line in lines) + b'ET'
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (len(objects)))
+        kids.append(len(objects))
+    
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>".encode('ascii')
+    
+    pdf = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    
+    xref = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    pdf += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    pdf += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+def make_pages():
+    random.seed(42)
+    coatings = ['полиэстер', 'пурал', 'пластизол', 'Safari', 'Printech']
+    return [
+        [
+            f"Профнастил С{random.choice([8, 10, 20, 21])} {random.choice(coatings)} "
+            f"0,{random.randint(4, 7)}5мм RAL {random.randint(1000, 9999)} {random.randint(300, 1500)},{line:02d} руб"
+            for line in range(LINES_PER_PAGE)
+        ]
+        for _ in range(PAGES)
+    ]
+
+def measure(processor, pdf_path):
+    started = time.perf_counter()
+    products = [product for page in processor.iter_page_products(pdf_path) for product in page]
+    return time.perf_counter() - started, products
+
+def main():
+    logging.disable(logging.INFO)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = os.path.join(tmp_dir, 'synthetic_pricelist.pdf')
+        with open(pdf_path, 'wb') as file:
+            file.write(build_pdf(make_pages()))
+        
+        cores = os.cpu_count() or 1
+        print(f"=== РАЗБОР PDF: {PAGES} страниц, {PAGES * LINES_PER_PAGE} строк, ядер: {cores} ===\n")
+        print(f"  {'процессов':>9} {'время, с':>10} {'стр/с':>8} {'ускорение':>10}")
+        
+        baseline = None
+        reference = None
+        for workers in sorted({1, 2, 4, cores}):
+            processor = PDFProcessor(use_page_cache=False)
+            processor.workers = workers
+            elapsed, products = measure(processor, pdf_path)
+            
+            baseline = baseline or elapsed
+            reference = reference or products
+            assert products == reference, "результат зависит от числа процессов"
+            
+            print(f"  {workers:>9} {elapsed:10.2f} {PAGES / elapsed:8.0f} {baseline / elapsed:10.2f}")
+        
+        if cores == 1:
+            print("\n  На одном ядре пул процессов не дает выигрыша - запустите на многоядерной машине")
+
+if __name__ == "__main__":
+    main()
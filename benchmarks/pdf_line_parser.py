@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк разбора строк прайса Металлпрофиль: прежний парсер (re.search/re.sub
+с текстом шаблона на каждую строку, перебор ключевых слов покрытия) против
+PDFProcessor._parse_lines с шаблонами, скомпилированными при загрузке модуля.
+
+Фикстура - 100 000 строк: товары с разными форматами толщины и покрытий,
+несколько цен в строке и строки без цены (заголовки, примечания).
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import logging
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.pdf_processor import PDFProcessor
+
+LINES = 100_000
+
+def legacy_thickness(product_name):
+    thickness_patterns = [
+        r'(\d+[,.]?\d*)\s*мм',
+        r'(\d+[,.]?\d*)\s*mm',
+        r'толщина\s*(\d+[,.]?\d*)',
+        r'(\d+[,.]?\d*)\s*(?=\s|$)'
+    ]
+    for pattern in thickness_patterns:
+        match = re.search(pattern, product_name, re.IGNORECASE)
+        if match:
+            return match.group(1).replace(',', '.')
+    return None
+
+def legacy_coating(product_name):
+    coating_keywords = [
+        'полиэстер', 'polyester', 'pe',
+        'пурал', 'pural', 'pu',
+        'пластизол', 'plastisol', 'pvc',
+        'printech', 'принтек',
+        'granite', 'гранит',
+        'velur', 'велюр',
+        'safari', 'сафари'
+    ]
+    product_lower = product_name.lower()
+    for keyword in coating_keywords:
+        if keyword in product_lower:
+            return keyword.title()
+    return None
+
+def legacy_parse(text):
+    products = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        price_pattern = r'(\d+[,.]?\d*)\s*руб'
+        price_match = re.search(price_pattern, line)
+        if price_match:
+            price = price_match.group(1).replace(',', '.')
+            product_name = re.sub(price_pattern, '', line).strip()
+            products.append({
+                'name': product_name,
+                'price': float(price),
+                'thickness': legacy_thickness(product_name),
+                'coating_type': legacy_coating(product_name),
+                'source': 'metallprofil'
+            })
+    return products
+
+def make_fixture():
+    random.seed(7)
+    names = ['Профнастил С8', 'Профнастил НС35', 'Металлочерепица Монтеррей', 'Сайдинг Lbrus', 'Штакетник']
+    coatings = ['полиэстер', 'Пурал Matt', 'пластизол', 'Printech', 'GraniteHD', 'Velur', 'Safari', 'PE', 'pural PE', '']
+    thickness = ['0,45мм', '0.5 мм', '0.7mm', 'толщина 0,4', '0.55', '']
+    lines = []
+    for i in range(LINES):
+        kind = random.random()
+        if kind < 0.15:
+            lines.append(random.choice(['Цены указаны с НДС', 'Раздел 3. Кровля', '   ', 'Стр. 12 из 300']))
+            continue
+        line = (f"{random.choice(names)} {random.choice(coatings)} {random.choice(thickness)} "
+                f"RAL{random.randint(1000, 9999)} {random.randint(100, 2000)},{i % 100:02d} руб")
+        if kind > 0.97:
+            line += f" / опт {random.randint(100, 2000)} руб."
+        lines.append(line)
+    return '\n'.join(lines)
+
+def measure(label, parse, text):
+    best = float('inf')
+    for _ in range(3):
+        started = time.perf_counter()
+        products = parse(text)
+        best = min(best, time.perf_counter() - started)
+    print(f"  {label:<26} {best:8.3f} с  {LINES / best:12.0f} строк/с")
+    return best, products
+
+def main():
+    logging.disable(logging.INFO)
+    text = make_fixture()
+    processor = PDFProcessor(use_page_cache=False)
+    
+    print(f"=== РАЗБОР СТРОК ПРАЙСА: {LINES} строк ===\n")
+    old, legacy_products = measure("прежний парсер", legacy_parse, text)
+    new, products = measure("скомпилированные шаблоны", processor._parse_lines, text)
+    
+    assert products == legacy_products, "результаты парсеров расходятся"
+    print(f"\n  товаров: {len(products)}, результаты совпадают, ускорение: x{old / new:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк форматов батча WebsiteUpdater на локальном сервере-заглушке.
+
+Заглушка принимает оба формата ('rows' и 'columnar', с gzip и без),
+считает байты тела запроса и время разбора на стороне сервера.
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.website_updater import WebsiteUpdater
+
+UPDATES = 20_000
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        
+        started = time.perf_counter()
+        raw = gzip.decompress(body) if self.headers.get('Content-Encoding') == 'gzip' else body
+        payload = json.loads(raw)
+        
+        if 'codes' in payload:
+            rows = list(zip(payload['codes'], payload['prices']))
+        else:
+            rows = [(update['code_1c'], float(update['price'])) for update in payload['updates']]
+        parse_time = time.perf_counter() - started
+        
+        with self.server.lock:
+            self.server.bytes_received += len(body)
+            self.server.parse_time += parse_time
+        
+        response = json.dumps({'success_count': len(rows), 'failed_count': 0}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+    
+    def log_message(self, format, *args):
+        pass
+
+def run_mode(server, payload_format, use_gzip, updates):
+    server.bytes_received = 0
+    server.parse_time = 0.0
+    
+    updater = WebsiteUpdater()
+    updater.api_url = f"http://127.0.0.1:{server.server_port}"
+    updater.payload_format = payload_format
+    updater.gzip_payload = use_gzip
+    
+    started = time.perf_counter()
+    stats = updater.update_prices_batch([dict(update) for update in updates])
+    elapsed = time.perf_counter() - started
+    
+    label = f"{payload_format}{' + gzip' if use_gzip else ''}"
+    print(f"  {label:<18} {server.bytes_received / 1024:10.1f} КБ "
+          f"{server.parse_time * 1000:10.1f} мс {elapsed:8.2f} с   {stats}")
+
+def main():
+    logging.disable(logging.WARNING)
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    
+    # Так выглядят обновления после validate_price_updates: цены строками
+    updates = [
+        {'code_1c': f"{100000 + i}", 'price': str(round(100 + i * 0.37, 2))}
+        for i in range(UPDATES)
+    ]
+    
+    print(f"=== ФОРМАТ БАТЧА: {UPDATES} обновлений ===\n")
+    print(f"  {'формат':<18} {'на проводе':>13} {'разбор':>13} {'всего':>10}")
+    for payload_format in ('rows', 'columnar'):
+        for use_gzip in (False, True):
+            run_mode(server, payload_format, use_gzip, updates)
+    
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
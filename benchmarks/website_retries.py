@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Проверка ожидания в WebsiteUpdater.update_prices_batch: повтор упавшего батча
+готов, а все WEBSITE_MAX_IN_FLIGHT слотов заняты медленными запросами. Цикл
+должен ждать завершения запроса, а не крутиться с нулевым таймаутом wait().
+
+Вместо сайта - сессия-заглушка: первый запрос падает сразу (обрыв соединения),
+остальные отвечают через SLOW_REQUEST секунд.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+import src.website_updater as website_updater
+from src.website_updater import WebsiteUpdater
+
+SLOW_REQUEST = 1.0
+BATCHES = 6
+MAX_WAIT_CALLS = 50
+
+class StandInResponse:
+    status_code = 200
+    
+    def __init__(self, count):
+        self.count = count
+    
+    def raise_for_status(self):
+        pass
+    
+    def json(self):
+        return {'success_count': self.count, 'failed_count': 0}
+
+class StandInSession:
+    def __init__(self):
+        self.requests = 0
+        self.lock = threading.Lock()
+    
+    def put(self, url, data=None, headers=None, timeout=None):
+        with self.lock:
+            self.requests += 1
+            first = self.requests == 1
+        if first:
+            raise requests.exceptions.ConnectionError("обрыв соединения")
+        time.sleep(SLOW_REQUEST)
+        return StandInResponse(1)
+
+def main():
+    logging.disable(logging.WARNING)
+    
+    updater = WebsiteUpdater()
+    updater.api_url = 'http://stand-in'
+    updater.session = StandInSession()
+    updater.batch_size = updater.min_batch_size = updater.max_batch_size = 1
+    updater.max_in_flight = 2
+    updater.retry_backoff = 0.01
+    
+    wait_calls = 0
+    original_wait = website_updater.wait
+    
+    def counting_wait(*args, **kwargs):
+        nonlocal wait_calls
+        wait_calls += 1
+        return original_wait(*args, **kwargs)
+    
+    website_updater.wait = counting_wait
+    try:
+        updates = [{'code_1c': f"{i:06d}", 'price': '100'} for i in range(BATCHES)]
+        started, cpu_started = time.perf_counter(), time.process_time()
+        stats = updater.update_prices_batch(updates)
+        elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    finally:
+        website_updater.wait = original_wait
+    
+    print(f"=== ПОВТОР ПРИ ЗАНЯТЫХ СЛОТАХ: {BATCHES} батчей, слотов {updater.max_in_flight} ===\n")
+    print(f"  результат: {stats}")
+    print(f"  время: {elapsed:.2f} с, процессор: {cpu:.2f} с, вызовов wait(): {wait_calls}")
+    
+    assert stats == {'success': BATCHES, 'failed': 0}, "повтор не дошел до сайта"
+    assert wait_calls <= MAX_WAIT_CALLS, f"цикл ожидания крутится вхолостую: {wait_calls} вызовов wait()"
+
+if __name__ == "__main__":
+    main()
@@ -8,13 +8,45 @@ class Config:
     GRANDLINE_BRANCH_ID = os.getenv('GRANDLINE_BRANCH_ID')
     GRANDLINE_AGREEMENT_ID = os.getenv('GRANDLINE_AGREEMENT_ID')
     GRANDLINE_BASE_URL = os.getenv('GRANDLINE_BASE_URL', 'https://api.grandline.ru')
+    GRANDLINE_PAGE_SIZE = int(os.getenv('GRANDLINE_PAGE_SIZE', '5000'))
+    GRANDLINE_CONCURRENCY = int(os.getenv('GRANDLINE_CONCURRENCY', '4'))
+    GRANDLINE_RATE_LIMIT = float(os.getenv('GRANDLINE_RATE_LIMIT', '5'))
+    GRANDLINE_RATE_BURST = int(os.getenv('GRANDLINE_RATE_BURST', '4'))
+    GRANDLINE_MAX_RETRIES = int(os.getenv('GRANDLINE_MAX_RETRIES', '5'))
+    # Время жизни записей кэша номенклатур в секундах (0 - без ограничения)
+    NOMENCLATURE_CACHE_TTL = int(os.getenv('NOMENCLATURE_CACHE_TTL', str(7 * 24 * 3600)))
+    # Отправлять только цены, изменившиеся с последнего успешного запуска
+    GRANDLINE_DELTA_SYNC = os.getenv('GRANDLINE_DELTA_SYNC', 'True').lower() == 'true'
+    PRICE_SNAPSHOT_FILE = os.getenv('PRICE_SNAPSHOT_FILE')
     
     METALLPROFIL_LOGIN = os.getenv('METALLPROFIL_LOGIN')
     METALLPROFIL_PASSWORD = os.getenv('METALLPROFIL_PASSWORD')
     METALLPROFIL_URL = os.getenv('METALLPROFIL_URL', 'https://lk.metallprofil.ru')
+    # Кэш разобранных страниц прайса: неизменившиеся страницы не разбираются повторно
+    PDF_PAGE_CACHE = os.getenv('PDF_PAGE_CACHE', 'True').lower() == 'true'
+    # Страницы, не встречавшиеся дольше этого срока (сек), удаляются из кэша
+    PDF_PAGE_CACHE_MAX_AGE = int(os.getenv('PDF_PAGE_CACHE_MAX_AGE', str(30 * 24 * 3600)))
+    # Процессы для разбора страниц PDF (0 - по числу ядер, 1 - без пула)
+    PDF_WORKERS = int(os.getenv('PDF_WORKERS', '1'))
+    # Пул процессов запускается, только если разбирать нужно не меньше страниц
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '50'))
     
     WEBSITE_API_URL = os.getenv('WEBSITE_API_URL')
     WEBSITE_API_KEY = os.getenv('WEBSITE_API_KEY')
+    WEBSITE_TIMEOUT = float(os.getenv('WEBSITE_TIMEOUT', '30'))
+    WEBSITE_BATCH_SIZE = int(os.getenv('WEBSITE_BATCH_SIZE', '100'))
+    WEBSITE_MIN_BATCH_SIZE = int(os.getenv('WEBSITE_MIN_BATCH_SIZE', '20'))
+    WEBSITE_MAX_BATCH_SIZE = int(os.getenv('WEBSITE_MAX_BATCH_SIZE', '1000'))
+    # Целевая задержка батча (сек): быстрее - батч растет, медленнее - уменьшается
+    WEBSITE_TARGET_LATENCY = float(os.getenv('WEBSITE_TARGET_LATENCY', '2'))
+    WEBSITE_MAX_IN_FLIGHT = int(os.getenv('WEBSITE_MAX_IN_FLIGHT', '4'))
+    WEBSITE_MAX_RETRIES = int(os.getenv('WEBSITE_MAX_RETRIES', '3'))
+    WEBSITE_RETRY_BACKOFF = float(os.getenv('WEBSITE_RETRY_BACKOFF', '1'))
+    WEBSITE_INDIVIDUAL_CONCURRENCY = int(os.getenv('WEBSITE_INDIVIDUAL_CONCURRENCY', '8'))
+    WEBSITE_CIRCUIT_BREAKER_THRESHOLD = int(os.getenv('WEBSITE_CIRCUIT_BREAKER_THRESHOLD', '10'))
+    # Формат батча: 'rows' ({'updates': [...]}) или 'columnar' ({'codes': [...], 'prices': [...]})
+    WEBSITE_PAYLOAD_FORMAT = os.getenv('WEBSITE_PAYLOAD_FORMAT', 'rows').lower()
+    WEBSITE_GZIP = os.getenv('WEBSITE_GZIP', 'False').lower() == 'true'
     
     DATABASE_TYPE = os.getenv('DATABASE_TYPE', 'mysql')
     DATABASE_HOST = os.getenv('DATABASE_HOST', 'localhost')
@@ -26,6 +58,17 @@ class Config:
     DATABASE_PRODUCTS_TABLE = os.getenv('DATABASE_PRODUCTS_TABLE', 'products')
     DATABASE_CODE_FIELD = os.getenv('DATABASE_CODE_FIELD', 'code_1c')
     DATABASE_PRICE_FIELD = os.getenv('DATABASE_PRICE_FIELD', 'price')
+    DATABASE_SKIP_UNCHANGED = os.getenv('DATABASE_SKIP_UNCHANGED', 'True').lower() == 'true'
+    DATABASE_PRICE_TOLERANCE = float(os.getenv('DATABASE_PRICE_TOLERANCE', '0.005'))
+    DATABASE_IN_CHUNK_SIZE = int(os.getenv('DATABASE_IN_CHUNK_SIZE', '500'))
+    # Начиная с этого количества кодов поиск идет через временную таблицу и JOIN
+    DATABASE_LOOKUP_JOIN_THRESHOLD = int(os.getenv('DATABASE_LOOKUP_JOIN_THRESHOLD', '20000'))
+    DATABASE_COMMIT_CHUNK_SIZE = int(os.getenv('DATABASE_COMMIT_CHUNK_SIZE', '1000'))
+    DATABASE_CHECKPOINT_FILE = os.getenv('DATABASE_CHECKPOINT_FILE')
+    DATABASE_PREPARED_STATEMENTS = os.getenv('DATABASE_PREPARED_STATEMENTS', 'True').lower() == 'true'
+    DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', '5'))
+    # Соединения, простаивавшие в пуле дольше (сек), закрываются при следующей выдаче
+    DATABASE_POOL_IDLE_TIMEOUT = int(os.getenv('DATABASE_POOL_IDLE_TIMEOUT', '300'))
     
     DOWNLOAD_DIR = os.getenv('DOWNLOAD_DIR', './downloads')
     LOG_DIR = os.getenv('LOG_DIR', './logs')
@@ -34,6 +77,28 @@ class Config:
     BROWSER_TIMEOUT = int(os.getenv('BROWSER_TIMEOUT', '30'))
     
     SYNC_SCHEDULE_TIME = os.getenv('SYNC_SCHEDULE_TIME', '09:00')
+    # Конвейерный режим: загрузка, сопоставление, валидация и запись идут параллельно
+    SYNC_PIPELINE = os.getenv('SYNC_PIPELINE', 'False').lower() == 'true'
+    # Максимум страниц в очереди между стадиями конвейера
+    SYNC_PIPELINE_QUEUE_SIZE = int(os.getenv('SYNC_PIPELINE_QUEUE_SIZE', '4'))
+    # Источники в sync_all_sources синхронизируются параллельно
+    SYNC_CONCURRENT = os.getenv('SYNC_CONCURRENT', 'True').lower() == 'true'
+    SYNC_MAX_WORKERS = int(os.getenv('SYNC_MAX_WORKERS', '4'))
+    # Лимиты одновременных синхронизаций по группам ресурсов: 'группа:лимит,...'
+    SYNC_GROUP_LIMITS = os.getenv('SYNC_GROUP_LIMITS', 'browser:1')
+    # Лимит времени на синхронизацию источника в секундах (0 - без ограничения)
+    SYNC_GRANDLINE_TIMEOUT = int(os.getenv('SYNC_GRANDLINE_TIMEOUT', '3600'))
+    SYNC_METALLPROFIL_TIMEOUT = int(os.getenv('SYNC_METALLPROFIL_TIMEOUT', '1800'))
+    
+    # Поиск кандидатов при сопоставлении по названиям: 'index' (слова) или 'tfidf' (numpy/scipy)
+    NAME_MATCH_BACKEND = os.getenv('NAME_MATCH_BACKEND', 'index')
+    # Процессы для сопоставления в auto_mapping.py и mapping_by_names.py (0 - по числу ядер)
+    MAPPING_WORKERS = int(os.getenv('MAPPING_WORKERS', '0'))
+    # Товаров GrandLine в одном диапазоне, отдаваемом процессу
+    MAPPING_SHARD_SIZE = int(os.getenv('MAPPING_SHARD_SIZE', '500'))
+    # Пересчитывать только новые и изменившиеся товары (полный пересчет - флаг --full)
+    MAPPING_INCREMENTAL = os.getenv('MAPPING_INCREMENTAL', 'True').lower() == 'true'
+    MAPPING_STATE_FILE = os.getenv('MAPPING_STATE_FILE')
     
     @classmethod
     def validate_config(cls):
@@ -78,11 +78,11 @@ def debug_codes():
         found_count = 0
         not_found_codes = []
         
-        for nomenclature_id, code_1c in list(nomenclatures.items())[:10]:
-            cursor.execute("SELECT COUNT(*) FROM oc_product WHERE model = %s", (code_1c,))
-            count = cursor.fetchone()[0]
-            
-            if count > 0:
+        codes_to_check = list(nomenclatures.values())[:10]
+        found_products = db_updater.get_products_info(codes_to_check, key_field='model', fields=[], table='oc_product')
+        
+        for code_1c in codes_to_check:
+            if code_1c in found_products:
                 found_count += 1
                 print(f"  ✅ {code_1c} найден в БД")
             else:
@@ -41,12 +41,13 @@ def find_mapping():
             print(f"\n   Поиск в поле '{field}':")
             found_any = False
             
+            found_products = db_updater.get_products_info(grandline_codes, key_field=field, fields=['product_id'], table='oc_product')
+            
             for code in grandline_codes:
-                cursor.execute(f"SELECT product_id, {field} FROM oc_product WHERE {field} = %s", (code,))
-                result = cursor.fetchone()
+                product = found_products.get(code)
                 
-                if result:
-                    print(f"     ✅ {code} найден: product_id={result[0]}")
+                if product:
+                    print(f"     ✅ {code} найден: product_id={product['product_id']}")
                     found_any = True
             
             if not found_any:
@@ -138,12 +139,15 @@ def find_mapping():
                     print(f"     {code}")
                 
                 # Проверяем есть ли совпадения
+                found_products = db_updater.get_products_info(
+                    grandline_codes[:3], key_field='suppler_code', fields=['product_id', 'model'], table='oc_product'
+                )
+                
                 for gl_code in grandline_codes[:3]:
-                    cursor.execute("SELECT product_id, model FROM oc_product WHERE suppler_code = %s", (gl_code,))
-                    result = cursor.fetchone()
+                    product = found_products.get(gl_code)
                     
-                    if result:
-                        print(f"   ✅ {gl_code} найден в suppler_code: product_id={result[0]}, model={result[1]}")
+                    if product:
+                        print(f"   ✅ {gl_code} найден в suppler_code: product_id={product['product_id']}, model={product['model']}")
             else:
                 print("   suppler_code пустой или не используется")
                 
@@ -8,6 +8,9 @@ from src.metallprofil_scraper import MetallprofilScraper
 from src.pdf_processor import PDFProcessor
 from src.website_updater import WebsiteUpdater
 from src.database_updater import DatabaseUpdater
+from src.price_snapshot import PriceSnapshot
+from src.pipeline import Pipeline
+from src.sources import SourceRegistry, SourceScheduler, CallableSource
 from src.scheduler import PriceSyncScheduler
 
 logger = setup_logging()
@@ -27,12 +30,27 @@ class PriceSyncManager:
         self.pdf_processor = PDFProcessor()
         self.website_updater = WebsiteUpdater()
         self.database_updater = DatabaseUpdater()
+        self.grandline_snapshot = PriceSnapshot('grandline') if Config.GRANDLINE_DELTA_SYNC else None
         self.scheduler = PriceSyncScheduler()
         
+        self.sources = SourceRegistry()
+        self.sources.register(CallableSource(
+            'grandline', lambda: self.sync_grandline(), priority=10,
+            timeout=Config.SYNC_GRANDLINE_TIMEOUT
+        ))
+        self.sources.register(CallableSource(
+            'metallprofil', lambda: self.sync_metallprofil(self._metallprofil_processing_rules()),
+            priority=20, timeout=Config.SYNC_METALLPROFIL_TIMEOUT, concurrency_group='browser'
+        ))
+        self.source_scheduler = SourceScheduler(max_workers=None if Config.SYNC_CONCURRENT else 1)
+        
         self.scheduler.set_sync_callback(self.sync_all_sources)
     
     @log_execution_time
     def sync_grandline(self) -> bool:
+        if Config.SYNC_PIPELINE:
+            return self.sync_grandline_pipeline()
+        
         try:
             logger.info("Starting GrandLine synchronization")
             
@@ -48,6 +66,21 @@ class PriceSyncManager:
                 logger.error("All GrandLine data failed validation")
                 return False
             
+            removed_codes = []
+            skipped = 0
+            if self.grandline_snapshot:
+                total = len(valid_updates)
+                valid_updates, removed_codes = self.grandline_snapshot.diff(valid_updates)
+                skipped = total - len(valid_updates)
+                
+                if removed_codes:
+                    logger.info(f"{len(removed_codes)} codes disappeared from the GrandLine price list since last run")
+                
+                if not valid_updates:
+                    self.grandline_snapshot.commit([], removed_codes)
+                    logger.info("GrandLine prices unchanged since last run, nothing to update")
+                    return True
+            
             if not self.database_updater.connect():
                 logger.error("Failed to connect to database")
                 return False
@@ -57,8 +90,90 @@ class PriceSyncManager:
             finally:
                 self.database_updater.disconnect()
             
-            logger.info(f"GrandLine sync completed. Success: {stats['success']}, failed: {stats['failed']}")
-            return stats['success'] > 0
+            if self.grandline_snapshot:
+                self.grandline_snapshot.commit(valid_updates, removed_codes,
+                                               self.database_updater.last_failed_codes)
+            
+            logger.info(f"GrandLine sync completed. Success: {stats['success']}, "
+                        f"unchanged: {stats['unchanged']}, failed: {stats['failed']}, "
+                        f"skipped by snapshot: {skipped}")
+            return stats['success'] + stats['unchanged'] + skipped > 0
+            
+        except Exception as e:
+            logger.error(f"Error syncing with GrandLine: {e}")
+            return False
+    
+    def sync_grandline_pipeline(self) -> bool:
+        """
+        Pipelined GrandLine sync: page fetch, nomenclature mapping, validation and
+        DB writes run as concurrent stages connected by bounded queues, so each page
+        is written while the next ones are still being fetched and mapped.
+        """
+        try:
+            logger.info("Starting GrandLine synchronization (pipeline mode)")
+            
+            snapshot = self.grandline_snapshot
+            previous = snapshot.load() if snapshot else {}
+            seen_codes = set()
+            counters = {'received': 0, 'valid': 0}
+            
+            def validate(pages):
+                for page in pages:
+                    counters['received'] += len(page)
+                    valid_page = self.database_updater.validate_price_updates(page)
+                    counters['valid'] += len(valid_page)
+                    
+                    if snapshot:
+                        seen_codes.update(update['code_1c'] for update in valid_page)
+                        valid_page = snapshot.changed(valid_page, previous)
+                    
+                    if valid_page:
+                        yield valid_page
+            
+            pipeline = (
+                Pipeline(self.grandline_client.iter_price_pages(),
+                         queue_size=Config.SYNC_PIPELINE_QUEUE_SIZE, name='grandline')
+                .stage('map', self.grandline_client.map_price_pages)
+                .stage('validate', validate)
+            )
+            
+            if not self.database_updater.connect():
+                logger.error("Failed to connect to database")
+                return False
+            
+            stats = {'success': 0, 'unchanged': 0, 'failed': 0}
+            try:
+                for page in pipeline:
+                    page_stats = self.database_updater.update_prices_batch(page)
+                    for key in stats:
+                        stats[key] += page_stats[key]
+                    
+                    if snapshot:
+                        snapshot.commit(page, failed_codes=self.database_updater.last_failed_codes)
+            finally:
+                self.database_updater.disconnect()
+            
+            if not counters['received']:
+                logger.warning("No data to update from GrandLine")
+                return False
+            
+            if not counters['valid']:
+                logger.error("All GrandLine data failed validation")
+                return False
+            
+            skipped = 0
+            if snapshot:
+                # Removed codes are only known once the whole price list has been read
+                removed_codes = [code_1c for code_1c in previous if code_1c not in seen_codes]
+                snapshot.commit([], removed_codes)
+                skipped = counters['valid'] - stats['success'] - stats['unchanged'] - stats['failed']
+                if removed_codes:
+                    logger.info(f"{len(removed_codes)} codes disappeared from the GrandLine price list since last run")
+            
+            logger.info(f"GrandLine sync completed. Success: {stats['success']}, "
+                        f"unchanged: {stats['unchanged']}, failed: {stats['failed']}, "
+                        f"skipped by snapshot: {skipped}")
+            return stats['success'] + stats['unchanged'] + skipped > 0
             
         except Exception as e:
             logger.error(f"Error syncing with GrandLine: {e}")
@@ -95,36 +210,26 @@ class PriceSyncManager:
             logger.error(f"Error syncing with Metallprofil: {e}")
             return False
     
+    def _metallprofil_processing_rules(self) -> dict:
+        return {
+            'thickness_range': {'min': 0.4, 'max': 1.0},
+            'coating_types': ['полиэстер', 'пурал'],
+            'keywords': {
+                'include': ['профнастил', 'металлочерепица'],
+                'exclude': ['брак', 'б/у']
+            }
+        }
+    
     @log_execution_time
     def sync_all_sources(self) -> dict:
-        results = {
-            'grandline': False,
-            'metallprofil': False,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        logger.info("Starting full synchronization of all sources")
-        
-        try:
-            results['grandline'] = self.sync_grandline()
-        except Exception as e:
-            logger.error(f"Critical error syncing GrandLine: {e}")
+        timestamp = datetime.now().isoformat()
+        logger.info(f"Starting full synchronization of all sources ({len(self.sources)})")
         
-        try:
-            processing_rules = {
-                'thickness_range': {'min': 0.4, 'max': 1.0},
-                'coating_types': ['полиэстер', 'пурал'],
-                'keywords': {
-                    'include': ['профнастил', 'металлочерепица'],
-                    'exclude': ['брак', 'б/у']
-                }
-            }
-            results['metallprofil'] = self.sync_metallprofil(processing_rules)
-        except Exception as e:
-            logger.error(f"Critical error syncing Metallprofil: {e}")
+        results = self.source_scheduler.run(self.sources.sources())
+        results['timestamp'] = timestamp
         
         success_count = sum(1 for result in results.values() if result is True)
-        logger.info(f"Full synchronization completed. Successful sources: {success_count}/2")
+        logger.info(f"Full synchronization completed. Successful sources: {success_count}/{len(self.sources)}")
         
         return results
     
@@ -8,59 +8,16 @@ import sys
 from dotenv import load_dotenv
 from src.database_updater import DatabaseUpdater
 from src.grandline_client import GrandLineClient
+from src.name_matcher import create_name_matcher, clean_name, name_similarity
+from src.mapping_runner import run_sharded
+from src.mapping_state import MappingState, load_mappings, scope_condition, stored_score
+from config import Config
 import logging
-from difflib import SequenceMatcher
-import re
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def clean_name(name):
-    """Очистка названия для лучшего сравнения"""
-    if not name:
-        return ""
-    
-    # Приводим к нижнему регистру
-    name = name.lower()
-    
-    # Убираем лишние пробелы и символы
-    name = re.sub(r'[^\w\s]', ' ', name)
-    name = re.sub(r'\s+', ' ', name).strip()
-    
-    # Убираем общие слова
-    stop_words = ['товар', 'изделие', 'продукт', 'материал', 'деталь']
-    words = name.split()
-    words = [w for w in words if w not in stop_words]
-    
-    return ' '.join(words)
-
-def name_similarity(name1, name2):
-    """Вычисляет схожесть названий"""
-    clean1 = clean_name(name1)
-    clean2 = clean_name(name2)
-    
-    if not clean1 or not clean2:
-        return 0
-    
-    # Базовая схожесть
-    base_similarity = SequenceMatcher(None, clean1, clean2).ratio()
-    
-    # Бонус за совпадающие ключевые слова
-    words1 = set(clean1.split())
-    words2 = set(clean2.split())
-    
-    if words1 and words2:
-        common_words = words1.intersection(words2)
-        word_bonus = len(common_words) / max(len(words1), len(words2))
-        
-        # Комбинируем базовую схожесть и бонус за слова
-        final_similarity = (base_similarity * 0.7) + (word_bonus * 0.3)
-    else:
-        final_similarity = base_similarity
-    
-    return min(final_similarity, 1.0)
-
 def get_grandline_products():
     """Получает товары из GrandLine с названиями"""
     grandline_client = GrandLineClient()
@@ -73,13 +30,13 @@ def get_grandline_products():
         
         print(f"Получено {len(prices)} позиций из GrandLine")
         
-        # Получаем номенклатуры с названиями (ограничиваем до 500 для тестирования)
-        test_nomenclature_ids = [item['nomenclature_id'] for item in prices[:500]]
-        nomenclatures = grandline_client.get_nomenclatures_with_names(test_nomenclature_ids)
+        # Получаем номенклатуры с названиями
+        nomenclature_ids = [item['nomenclature_id'] for item in prices]
+        nomenclatures = grandline_client.get_nomenclatures_with_names(nomenclature_ids)
         
         # Формируем список товаров с ценами, кодами и названиями
         products = []
-        for price_item in prices[:500]:
+        for price_item in prices:
             nomenclature_id = price_item['nomenclature_id']
             if nomenclature_id in nomenclatures:
                 nomenclature_info = nomenclatures[nomenclature_id]
@@ -92,7 +49,7 @@ def get_grandline_products():
                 })
         
         return products
-        
+    
     except Exception as e:
         logger.error(f"Ошибка получения товаров из GrandLine: {e}")
         return []
@@ -114,7 +71,6 @@ def get_opencart_products():
             WHERE p.model IS NOT NULL AND p.model != ''
             AND pd.name IS NOT NULL AND pd.name != ''
             AND pd.language_id = 1
-            LIMIT 1000
         """)
         
         products = []
@@ -129,7 +85,7 @@ def get_opencart_products():
             })
         
         return products
-        
+    
     except Exception as e:
         logger.error(f"Ошибка получения товаров из OpenCart: {e}")
         return []
@@ -142,19 +98,18 @@ def find_matches_by_names(grandline_products, opencart_products, min_similarity=
     
     print(f"Поиск соответствий между {len(grandline_products)} товарами GrandLine и {len(opencart_products)} товарами OpenCart...")
     
-    for i, gl_product in enumerate(grandline_products):
-        if i % 50 == 0:
-            print(f"Обработано {i}/{len(grandline_products)} товаров...")
-        
+    # Названия OpenCart очищаются и индексируются один раз на весь прогон,
+    # названия GrandLine делятся между процессами (MAPPING_WORKERS)
+    matcher = create_name_matcher([oc_product['name'] for oc_product in opencart_products])
+    results = run_sharded(matcher, [gl_product['name'] for gl_product in grandline_products], min_similarity)
+    
+    for gl_product, found in zip(grandline_products, results):
         best_match = None
         best_score = 0
         
-        for oc_product in opencart_products:
-            similarity = name_similarity(gl_product['name'], oc_product['name'])
-            
-            if similarity > best_score and similarity >= min_similarity:
-                best_match = oc_product
-                best_score = similarity
+        if found:
+            position, best_score = found
+            best_match = opencart_products[position]
         
         if best_match:
             matches.append({
@@ -168,6 +123,50 @@ def find_matches_by_names(grandline_products, opencart_products, min_similarity=
     
     return matches
 
+def find_incremental_matches_by_names(grandline_products, opencart_products, plan, mappings, min_similarity=0.7):
+    """
+    Сопоставляет только то, что изменилось с прошлого запуска
+    
+    Товары GrandLine из плана (новые, переименованные и потерявшие свой товар
+    OpenCart) сравниваются со всем каталогом, остальные - только с новыми и
+    измененными товарами OpenCart, и их соответствие меняется, лишь если новое
+    совпадение лучше сохраненного.
+    
+    Returns:
+        tuple: (совпадения, коды GrandLine, чьи сохраненные соответствия нужно удалить)
+    """
+    rescore, changed_opencart, removed_grandline = plan
+    full = [product for product in grandline_products if product['code_1c'] in rescore]
+    rest = [product for product in grandline_products if product['code_1c'] not in rescore]
+    new_products = [product for product in opencart_products if product['model'] in changed_opencart]
+    
+    matches = find_matches_by_names(full, opencart_products, min_similarity) if full else []
+    if rest and new_products:
+        matches.extend(
+            match for match in find_matches_by_names(rest, new_products, min_similarity)
+            if stored_score(match['similarity']) > mappings.get(match['grandline_code'], (None, 0))[1]
+        )
+    
+    # Пересчитанные товары без уверенного совпадения и пропавшие из GrandLine теряют старые соответствия
+    confident = {match['grandline_code'] for match in matches if match['similarity'] >= 0.8}
+    stale = {code for code in rescore if code in mappings and code not in confident}
+    stale.update(code for code in removed_grandline if code in mappings)
+    return matches, stale
+
+def load_saved_mappings():
+    """Сохраненные соответствия или None, если их не удалось прочитать"""
+    db_updater = DatabaseUpdater()
+    if not db_updater.connect():
+        return None
+    
+    try:
+        return load_mappings(db_updater.connection.cursor(), 'names')
+    except Exception as e:
+        logger.warning(f"Не удалось загрузить сохраненные соответствия: {e}")
+        return None
+    finally:
+        db_updater.disconnect()
+
 def mapping_by_names():
     """Основная функция сопоставления по названиям"""
     
@@ -206,8 +205,32 @@ def mapping_by_names():
         print(f"  {product['model']}: {product['name']}")
     
     # 4. Поиск соответствий
-    print(f"\n4. Поиск соответствий по названиям...")
-    matches = find_matches_by_names(grandline_products, opencart_products, min_similarity=0.7)
+    state = MappingState('names')
+    grandline_fingerprints = {
+        product['code_1c']: MappingState.fingerprint(product['code_1c'], product['name'])
+        for product in grandline_products
+    }
+    opencart_fingerprints = {
+        product['model']: MappingState.fingerprint(product['model'], product['name'])
+        for product in opencart_products
+    }
+    
+    plan = None
+    mappings = None
+    if Config.MAPPING_INCREMENTAL and '--full' not in sys.argv and not state.is_empty():
+        mappings = load_saved_mappings()
+        if mappings is not None:
+            plan = state.plan(grandline_fingerprints, opencart_fingerprints, mappings)
+    
+    if plan:
+        print(f"\n4. Поиск соответствий для новых и изменившихся товаров...")
+        matches, stale_codes = find_incremental_matches_by_names(
+            grandline_products, opencart_products, plan, mappings, min_similarity=0.7
+        )
+    else:
+        print(f"\n4. Поиск соответствий по названиям...")
+        matches = find_matches_by_names(grandline_products, opencart_products, min_similarity=0.7)
+        stale_codes = set()
     
     print(f"Найдено {len(matches)} соответствий")
     
@@ -223,7 +246,8 @@ def mapping_by_names():
             print()
     
     # 6. Создание таблицы соответствий
-    if matches:
+    saved = not (matches or stale_codes)
+    if matches or stale_codes:
         print(f"6. Создание таблицы соответствий...")
         
         db_updater = DatabaseUpdater()
@@ -247,17 +271,31 @@ def mapping_by_names():
                     )
                 """)
                 
-                # Очищаем старые данные
-                cursor.execute("DELETE FROM oc_grandline_mapping")
+                # При полном пересчете очищаем старые данные, при инкрементальном удаляем только устаревшие
+                if plan:
+                    cursor.executemany(
+                        f"DELETE FROM oc_grandline_mapping WHERE grandline_code = %s AND {scope_condition('names')}",
+                        [(code,) for code in stale_codes]
+                    )
+                else:
+                    cursor.execute(f"DELETE FROM oc_grandline_mapping WHERE {scope_condition('names')}")
                 
-                # Вставляем соответствия с высокой схожестью
+                # Вставляем соответствия с высокой схожестью; строки сопоставления по кодам не перезаписываются.
+                # mapping_method обновляется последним: условия выше видят его старое значение
                 high_confidence = [m for m in matches if m['similarity'] >= 0.8]
+                own_row = scope_condition('names')
                 
                 for match in high_confidence:
-                    cursor.execute("""
+                    cursor.execute(f"""
                         INSERT INTO oc_grandline_mapping 
                         (grandline_code, opencart_model, similarity_score, mapping_method, grandline_name, opencart_name) 
                         VALUES (%s, %s, %s, %s, %s, %s)
+                        ON DUPLICATE KEY UPDATE
+                            opencart_model = IF({own_row}, VALUES(opencart_model), opencart_model),
+                            similarity_score = IF({own_row}, VALUES(similarity_score), similarity_score),
+                            grandline_name = IF({own_row}, VALUES(grandline_name), grandline_name),
+                            opencart_name = IF({own_row}, VALUES(opencart_name), opencart_name),
+                            mapping_method = IF({own_row}, VALUES(mapping_method), mapping_method)
                     """, (
                         match['grandline_code'],
                         match['opencart_model'],
@@ -268,16 +306,31 @@ def mapping_by_names():
                     ))
                 
                 db_updater.connection.commit()
-                print(f"✅ Создано {len(high_confidence)} соответствий с высокой уверенностью (≥80%)")
-                
+                saved = True
+                if plan:
+                    print(f"✅ Обновлено {len(high_confidence)} соответствий с высокой уверенностью (≥80%), "
+                          f"удалено устаревших: {len(stale_codes)}")
+                else:
+                    print(f"✅ Создано {len(high_confidence)} соответствий с высокой уверенностью (≥80%)")
+            
             except Exception as e:
                 print(f"❌ Ошибка создания таблицы: {e}")
             finally:
                 db_updater.disconnect()
     
+    # Отпечатки фиксируются только после записи соответствий, иначе следующий запуск их пропустит
+    if saved:
+        state.save(grandline_fingerprints, opencart_fingerprints)
+    state.close()
+    
     # 7. Статистика
     total_gl = len(grandline_products)
-    high_confidence = len([m for m in matches if m['similarity'] >= 0.8])
+    confident_codes = {m['grandline_code'] for m in matches if m['similarity'] >= 0.8}
+    if plan:
+        # Сохраненные соответствия, оставшиеся после удаления устаревших, плюс обновленные
+        confident_codes |= set(mappings) - stale_codes
+        confident_codes &= {product['code_1c'] for product in grandline_products}
+    high_confidence = len(confident_codes)
     coverage = (high_confidence / total_gl) * 100 if total_gl > 0 else 0
     
     print(f"\n=== РЕЗУЛЬТАТЫ ===")
@@ -0,0 +1,263 @@
+"""
+Индекс кодов OpenCart для сопоставления с кодами GrandLine
+"""
+import math
+from collections import Counter, defaultdict
+from itertools import chain
+from operator import itemgetter
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+class CodeMatcher:
+    """
+    Ищет для кода GrandLine лучший код OpenCart по тем же правилам, что и полный
+    перебор: точное совпадение (1.0), общие последние 4 символа (0.8), общие первые
+    3 символа (0.7), схожесть SequenceMatcher. При равной оценке выигрывает код,
+    стоящий раньше в списке OpenCart.
+    
+    Точные, суффиксные и префиксные совпадения берутся из словарей за O(1).
+    SequenceMatcher считается только для кандидатов двух видов:
+    
+    - коды, у которых с кодом GrandLine есть общие сегменты. Код OpenCart делится
+      на d + 2 сегмента, где d - наибольшее число вставок и удалений при схожести
+      CONFIDENT_SIMILARITY; каждая вставка или удаление разрывает не больше одного
+      сегмента, так что минимум два остаются целыми и находятся в коде GrandLine со
+      сдвигом не больше d. Поэтому совпадения со схожестью от CONFIDENT_SIMILARITY
+      (они и попадают в oc_grandline_mapping) те же, что при полном переборе;
+    - несколько кодов с наибольшим числом общих редких n-грамм - для более слабых
+      совпадений, которые без общей n-граммы из индекса не находятся.
+    """
+    
+    SUFFIX_LENGTH = 4
+    PREFIX_LENGTH = 3
+    NGRAM = 3
+    CONFIDENT_SIMILARITY = 0.8
+    
+    def __init__(self, opencart_codes: List[str], max_candidates: int = 100, posting_budget: int = 2000):
+        self.codes = list(opencart_codes)
+        self.max_candidates = max_candidates
+        self.posting_budget = posting_budget
+        
+        # Код -> позиция первого вхождения: по ней разрешаются равные оценки
+        self.positions: Dict[str, int] = {}
+        self.suffixes: Dict[str, int] = {}
+        self.prefixes: Dict[str, int] = {}
+        self.ngrams: Dict[str, List[int]] = defaultdict(list)
+        # (длина кода, d, номер сегмента, сегмент) -> позиции; длина кода -> d, под которые он разбит
+        self.segments: Dict[Tuple[int, int, int, str], List[int]] = defaultdict(list)
+        self.distances: Dict[int, List[int]] = {}
+        # Мультимножество символов кода битовой маской: по биту на каждую пару
+        # (символ, номер его вхождения в код)
+        self.bits: Dict[Tuple[str, int], int] = {}
+        self.masks: List[int] = []
+        self.lengths: List[int] = []
+        
+        for position, code in enumerate(self.codes):
+            self.positions.setdefault(code, position)
+            self.masks.append(self._mask(code, grow=True))
+            self.lengths.append(len(code))
+            if len(code) >= self.SUFFIX_LENGTH:
+                self.suffixes.setdefault(code[-self.SUFFIX_LENGTH:], position)
+            if len(code) >= self.PREFIX_LENGTH:
+                self.prefixes.setdefault(code[:self.PREFIX_LENGTH], position)
+            for ngram in self._ngrams(code):
+                self.ngrams[ngram].append(position)
+            
+            if len(code) not in self.distances:
+                self.distances[len(code)] = self._length_distances(len(code))
+            for distance in self.distances[len(code)]:
+                for number, (start, end) in enumerate(self._split(len(code), self._parts(len(code), distance))):
+                    self.segments[(len(code), distance, number, code[start:end])].append(position)
+    
+    def _mask(self, code: str, grow: bool = False) -> int:
+        mask = 0
+        occurrences = Counter()
+        for char in code:
+            key = (char, occurrences[char])
+            occurrences[char] += 1
+            bit = self.bits.get(key)
+            if bit is None:
+                if not grow:
+                    continue
+                bit = self.bits[key] = len(self.bits)
+            mask |= 1 << bit
+        return mask
+    
+    @staticmethod
+    def _max_distance(total_length: int, similarity: float) -> int:
+        """Наибольшее число вставок и удалений между кодами суммарной длины total_length при схожести similarity"""
+        # ratio = 2 * M / total_length, а M не больше длины общей подпоследовательности
+        matches = math.ceil(similarity * total_length / 2)
+        while matches and 2.0 * (matches - 1) / total_length >= similarity:
+            matches -= 1
+        while 2.0 * matches / total_length < similarity:
+            matches += 1
+        return total_length - 2 * matches
+    
+    def _length_distances(self, length: int) -> List[int]:
+        """
+        d, под которые разбивается код OpenCart длины length: наибольшее при
+        CONFIDENT_SIMILARITY и на единицу меньше. Меньшие d (более высокая найденная
+        оценка) берут разбиение под d - 1 и требуют больше целых сегментов - так
+        индекс вдвое-втрое меньше, чем с разбиением под каждое d.
+        """
+        limit = max(0, max(
+            self._max_distance(length + other, self.CONFIDENT_SIMILARITY)
+            for other in range(1, 2 * length + 2)
+        ))
+        return sorted({max(0, limit - 1), limit})
+    
+    @staticmethod
+    def _parts(length: int, distance: int) -> int:
+        # Для совсем коротких кодов сегментов меньше, но хотя бы один из них цел
+        return min(distance + 2, length)
+    
+    @staticmethod
+    def _split(length: int, parts: int) -> List[Tuple[int, int]]:
+        return [(number * length // parts, (number + 1) * length // parts) for number in range(parts)]
+    
+    def _confident_candidates(self, code: str, similarity: float) -> Set[int]:
+        """Все коды, схожесть с которыми может достигать similarity (не ниже CONFIDENT_SIMILARITY)"""
+        candidates = set()
+        for length, distances in self.distances.items():
+            # Берется разбиение под ближайшее индексированное d не меньше фактического:
+            # целыми остаются не меньше parts - d сегментов
+            distance = self._max_distance(len(code) + length, similarity)
+            if abs(len(code) - length) > distance:
+                continue
+            indexed = next(indexed for indexed in distances if indexed >= distance)
+            
+            # Целый сегмент сдвигается влево на число удаленных перед ним символов
+            # кода OpenCart и вправо на число вставленных символов кода GrandLine
+            shift = len(code) - length
+            left, right = (distance - shift) // 2, (distance + shift) // 2
+            parts = self._parts(length, indexed)
+            
+            # Для каждого сегмента - подстроки кода GrandLine, где он может стоять целым,
+            # и списки кодов с ним; размер списков оценивается без их объединения
+            windows = []
+            for number, (start, end) in enumerate(self._split(length, parts)):
+                size = end - start
+                allowed = {code[offset:offset + size]
+                           for offset in range(max(0, start - left), min(len(code) - size, start + right) + 1)}
+                postings = [self.segments[key] for key in ((length, indexed, number, part) for part in allowed)
+                            if key in self.segments]
+                windows.append((sum(map(len, postings)), start, end, allowed, postings))
+            windows.sort(key=itemgetter(0))
+            
+            # Код с required целыми сегментами есть хотя бы в одном из parts - required + 1
+            # самых редких: частые сегменты (общий префикс и т.п.) кандидатов не дают
+            required = parts - distance
+            found = set()
+            for _, _, _, _, postings in windows[:parts - max(required, 1) + 1]:
+                for posting in postings:
+                    found.update(posting)
+            
+            if required <= 1:
+                candidates |= found
+                continue
+            
+            # at_least[k] - кандидаты хотя бы с k + 1 целыми сегментами; все операции над множествами
+            at_least = [set() for _ in range(required)]
+            for _, _, _, _, postings in windows:
+                hit = set()
+                for posting in postings:
+                    hit.update(found.intersection(posting))
+                for level in range(required - 1, 0, -1):
+                    at_least[level] |= at_least[level - 1] & hit
+                at_least[0] |= hit
+            candidates |= at_least[-1]
+        return candidates
+    
+    def _ngrams(self, code: str) -> set:
+        if len(code) <= self.NGRAM:
+            return {code}
+        return {code[i:i + self.NGRAM] for i in range(len(code) - self.NGRAM + 1)}
+    
+    def _fuzzy_candidates(self, code: str) -> List[int]:
+        # Начинаем с самых редких n-грамм и останавливаемся, когда списки становятся слишком длинными
+        postings = sorted(
+            (self.ngrams[ngram] for ngram in self._ngrams(code) if ngram in self.ngrams),
+            key=len
+        )
+        
+        selected = []
+        scanned = 0
+        for posting in postings:
+            if selected and scanned + len(posting) > self.posting_budget:
+                break
+            scanned += len(posting)
+            selected.append(posting)
+        
+        # Подсчет общих n-грамм и отбор лучших идут в C (Counter, most_common)
+        counts = Counter(chain.from_iterable(selected))
+        return [position for position, _ in counts.most_common(self.max_candidates)]
+    
+    def _score(self, code: str, positions: Iterable[int], mask: int,
+               scored: List[Tuple[float, int]], best_score: float, min_similarity: float) -> float:
+        """Добавляет в scored кандидатов со схожестью от min_similarity, возвращает лучшую оценку"""
+        # Число общих символов с учетом повторов - то же, что считает quick_ratio,
+        # верхняя граница ratio; пересечение масок и подсчет битов идут в C
+        threshold = max(best_score, min_similarity)
+        masks, lengths, size = self.masks, self.lengths, len(code)
+        bounded = [
+            (bound, position) for bound, position in (
+                (2.0 * bin(mask & masks[position]).count('1') / (size + lengths[position]), position)
+                for position in positions
+            ) if bound >= threshold
+        ]
+        
+        for bound, position in bounded:
+            if bound < max(best_score, min_similarity):
+                continue
+            score = SequenceMatcher(None, code, self.codes[position]).ratio()
+            if score >= min_similarity:
+                scored.append((score, position))
+                best_score = max(best_score, score)
+        return best_score
+    
+    def match(self, code: str, min_similarity: float = 0.6) -> Optional[Dict]:
+        """
+        Returns:
+            Optional[Dict]: {'opencart_code', 'similarity', 'method'} или None
+        """
+        if code in self.positions:
+            best_score, best_position = 1.0, self.positions[code]
+        else:
+            # Кандидаты (оценка, позиция); лучший - с максимальной оценкой и минимальной позицией
+            scored = []
+            if len(code) >= self.SUFFIX_LENGTH and code[-self.SUFFIX_LENGTH:] in self.suffixes:
+                scored.append((0.8, self.suffixes[code[-self.SUFFIX_LENGTH:]]))
+            if len(code) >= self.PREFIX_LENGTH and code[:self.PREFIX_LENGTH] in self.prefixes:
+                scored.append((0.7, self.prefixes[code[:self.PREFIX_LENGTH]]))
+            
+            best_score = max((score for score, _ in scored), default=0)
+            mask = self._mask(code)
+            fuzzy = self._fuzzy_candidates(code)
+            best_score = self._score(code, fuzzy, mask, scored, best_score, min_similarity)
+            
+            # Коды не хуже уже найденного и от CONFIDENT_SIMILARITY ищутся без пропусков;
+            # чем выше найденная оценка, тем длиннее сегменты и меньше кандидатов
+            confident = self._confident_candidates(code, max(best_score, self.CONFIDENT_SIMILARITY))
+            confident.difference_update(fuzzy)
+            best_score = self._score(code, confident, mask, scored, best_score, min_similarity)
+            
+            if not scored:
+                return None
+            best_score, best_position = min(scored, key=lambda item: (-item[0], item[1]))
+        
+        if best_score < min_similarity:
+            return None
+        
+        return {
+            'opencart_code': self.codes[best_position],
+            'similarity': best_score,
+            'method': 'exact' if best_score == 1.0 else
+                      'suffix' if best_score == 0.8 else
+                      'prefix' if best_score == 0.7 else 'similarity'
+        }
+    
+    def iter_matches(self, codes: Iterable[str], min_similarity: float = 0.6) -> Iterator[Optional[Dict]]:
+        """Результаты match для каждого кода в исходном порядке"""
+        for code in codes:
+            yield self.match(code, min_similarity)
@@ -1,15 +1,119 @@
+import os
+import json
+import time
+import hashlib
 import logging
+import threading
 import mysql.connector
 import psycopg2
+from psycopg2.extras import execute_values
 import sqlite3
-from typing import List, Dict, Optional, Union
+from typing import List, Dict, Optional, Union, Callable, Iterable, Set, Tuple
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+class ConnectionPool:
+    """
+    Пул соединений с БД: проверка соединения при выдаче (SELECT 1)
+    и закрытие соединений, простаивавших дольше idle_timeout
+    """
+    
+    def __init__(self, factory: Callable, max_size: int = 5, idle_timeout: float = 300):
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.idle = []
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception as e:
+            logger.debug(f"Error closing pooled connection: {e}")
+    
+    @staticmethod
+    def _is_alive(connection) -> bool:
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            finally:
+                cursor.close()
+            return True
+        except Exception as e:
+            logger.info(f"Pooled connection failed health check: {e}")
+            return False
+    
+    def acquire(self):
+        self.evict_idle()
+        
+        while True:
+            with self.lock:
+                if not self.idle:
+                    break
+                connection, released_at = self.idle.pop()
+            
+            if time.monotonic() - released_at > self.idle_timeout:
+                self._close(connection)
+                continue
+            
+            if self._is_alive(connection):
+                return connection
+            
+            self._close(connection)
+        
+        return self.factory()
+    
+    def release(self, connection):
+        # Незавершенная транзакция не должна достаться следующему владельцу
+        try:
+            connection.rollback()
+        except Exception:
+            self._close(connection)
+            return
+        
+        with self.lock:
+            if len(self.idle) < self.max_size:
+                self.idle.append((connection, time.monotonic()))
+                return
+        
+        self._close(connection)
+    
+    def evict_idle(self) -> int:
+        now = time.monotonic()
+        with self.lock:
+            expired = [conn for conn, released_at in self.idle if now - released_at > self.idle_timeout]
+            self.idle = [(conn, released_at) for conn, released_at in self.idle
+                         if now - released_at <= self.idle_timeout]
+        
+        for connection in expired:
+            self._close(connection)
+        return len(expired)
+    
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        
+        for connection, _ in idle:
+            self._close(connection)
+
+
+# Пулы общие для всех экземпляров DatabaseUpdater с одинаковыми параметрами подключения
+_pools: Dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
 class DatabaseUpdater:
     
-    def __init__(self):
+    # Временные таблицы для массовой загрузки цен и поиска товаров
+    STAGING_TABLE = 'tmp_price_updates'
+    LOOKUP_TABLE = 'tmp_product_lookup'
+    
+    def __init__(self, name: Optional[str] = None):
+        # name - источник цен: у каждого источника своя контрольная точка
+        self.name = name
         self.db_type = Config.DATABASE_TYPE
         self.db_host = Config.DATABASE_HOST
         self.db_port = Config.DATABASE_PORT
@@ -19,41 +123,249 @@ class DatabaseUpdater:
         self.products_table = Config.DATABASE_PRODUCTS_TABLE
         self.price_field = Config.DATABASE_PRICE_FIELD
         self.code_field = Config.DATABASE_CODE_FIELD
+        self.skip_unchanged = Config.DATABASE_SKIP_UNCHANGED
+        self.price_tolerance = Config.DATABASE_PRICE_TOLERANCE
+        self.in_chunk_size = Config.DATABASE_IN_CHUNK_SIZE
+        self.lookup_join_threshold = Config.DATABASE_LOOKUP_JOIN_THRESHOLD
+        self.pool_size = Config.DATABASE_POOL_SIZE
+        self.pool_idle_timeout = Config.DATABASE_POOL_IDLE_TIMEOUT
+        self.commit_chunk_size = max(1, Config.DATABASE_COMMIT_CHUNK_SIZE)
+        self.checkpoint_file = self._checkpoint_path(name)
+        self.use_prepared = Config.DATABASE_PREPARED_STATEMENTS
+        
+        # Текст запросов под диалект строится один раз на экземпляр
+        self.placeholder = '?' if self.db_type.lower() == 'sqlite' else '%s'
+        self.statements = self._build_statements()
+        self._dynamic_statements: Dict[tuple, str] = {}
+        self._prepared_cursors: Dict[str, object] = {}
+        
+        # Коды, не записанные последним update_prices_batch (нет в БД или ошибка пачки)
+        self.last_failed_codes: Set[str] = set()
         
         self.connection = None
     
-    def connect(self) -> bool:
+    def _build_statements(self) -> Dict[str, str]:
+        db_type = self.db_type.lower()
+        table = self.products_table
+        code = self.code_field
+        price = self.price_field
+        staging = self.STAGING_TABLE
+        lookup = self.LOOKUP_TABLE
+        ph = self.placeholder
+        
+        statements = {
+            'update_price': f"UPDATE {table} SET {price} = {ph} WHERE {code} = {ph}",
+            'select_product': f"SELECT {code}, {price} FROM {table} WHERE {code} = {ph}",
+            'count_products': f"SELECT COUNT(*) FROM {table}",
+            # Структура копируется из таблицы товаров, чтобы совпали типы и collation
+            'create_staging': f"CREATE {'TEMPORARY' if db_type == 'mysql' else 'TEMP'} TABLE {staging} AS "
+                              f"SELECT {code} AS code, {price} AS price FROM {table} WHERE 1 = 0",
+            'insert_staging': f"INSERT INTO {staging} (code, price) VALUES ({ph}, {ph})",
+            'missing_staged': f"SELECT t.code FROM {staging} t "
+                              f"LEFT JOIN {table} p ON p.{code} = t.code "
+                              f"WHERE p.{code} IS NULL",
+            'insert_lookup': f"INSERT INTO {lookup} (code) VALUES ({ph})",
+        }
+        
+        if db_type == 'mysql':
+            statements.update({
+                'drop_staging': f"DROP TEMPORARY TABLE IF EXISTS {staging}",
+                'drop_lookup': f"DROP TEMPORARY TABLE IF EXISTS {lookup}",
+                'apply_staged': f"UPDATE {table} p JOIN {staging} t ON p.{code} = t.code "
+                                f"SET p.{price} = t.price",
+            })
+        elif db_type == 'postgresql':
+            statements.update({
+                'drop_staging': f"DROP TABLE IF EXISTS {staging}",
+                'drop_lookup': f"DROP TABLE IF EXISTS {lookup}",
+                # execute_values подставляет все строки в единственный %s
+                'insert_staging': f"INSERT INTO {staging} (code, price) VALUES %s",
+                'insert_lookup': f"INSERT INTO {lookup} (code) VALUES %s",
+                'apply_staged': f"UPDATE {table} AS p SET {price} = t.price "
+                                f"FROM {staging} t WHERE p.{code} = t.code",
+            })
+        else:
+            statements.update({
+                'drop_staging': f"DROP TABLE IF EXISTS temp.{staging}",
+                'drop_lookup': f"DROP TABLE IF EXISTS temp.{lookup}",
+                'index_staging': f"CREATE INDEX temp.idx_{staging}_code ON {staging} (code)",
+                'apply_staged': f"UPDATE {table} SET {price} = ("
+                                f"SELECT t.price FROM {staging} t WHERE t.code = {table}.{code}) "
+                                f"WHERE {code} IN (SELECT code FROM {staging})",
+            })
+        
+        return statements
+    
+    def _cached_statement(self, cache_key: tuple, build: Callable[[], str]) -> str:
+        """Запросы, зависящие от параметров вызова, тоже строятся один раз на комбинацию"""
+        sql = self._dynamic_statements.get(cache_key)
+        if sql is None:
+            sql = build()
+            self._dynamic_statements[cache_key] = sql
+        return sql
+    
+    def _lookup_products(self, cursor, codes: List, key_field: str, fields: Tuple[str, ...],
+                         table: Optional[str] = None) -> Dict[str, Dict]:
+        """
+        Выбирает товары по списку кодов: пачками WHERE key IN (...), а для очень
+        больших наборов - через временную таблицу и JOIN одним запросом
+        """
+        table = table or self.products_table
+        columns = ', '.join(f"p.{field}" for field in (key_field, *fields))
+        names = (key_field, *fields)
+        products = {}
+        
+        # Результат ключуем запрошенными кодами, даже если поле в БД числовое
+        requested = {str(code): code for code in codes}
+        
+        def collect(rows):
+            for row in rows:
+                products.setdefault(requested.get(str(row[0]), row[0]), dict(zip(names, row)))
+        
+        if len(codes) <= self.lookup_join_threshold:
+            for i in range(0, len(codes), self.in_chunk_size):
+                chunk = codes[i:i + self.in_chunk_size]
+                sql = self._cached_statement(('lookup_in', table, key_field, fields, len(chunk)), lambda: (
+                    f"SELECT {columns} FROM {table} p "
+                    f"WHERE p.{key_field} IN ({', '.join([self.placeholder] * len(chunk))})"
+                ))
+                cursor.execute(sql, chunk)
+                collect(cursor.fetchall())
+            return products
+        
+        lookup = self.LOOKUP_TABLE
+        create_sql = self._cached_statement(('lookup_create', table, key_field), lambda: (
+            f"CREATE {'TEMPORARY' if self.db_type.lower() == 'mysql' else 'TEMP'} TABLE {lookup} AS "
+            f"SELECT {key_field} AS code FROM {table} WHERE 1 = 0"
+        ))
+        join_sql = self._cached_statement(('lookup_join', table, key_field, fields), lambda: (
+            f"SELECT {columns} FROM {table} p JOIN {lookup} t ON p.{key_field} = t.code"
+        ))
+        rows = [(code,) for code in codes]
+        
+        cursor.execute(self.statements['drop_lookup'])
+        cursor.execute(create_sql)
+        if self.db_type.lower() == 'postgresql':
+            execute_values(cursor, self.statements['insert_lookup'], rows, page_size=1000)
+        else:
+            cursor.executemany(self.statements['insert_lookup'], rows)
+        cursor.execute(join_sql)
+        collect(cursor.fetchall())
+        cursor.execute(self.statements['drop_lookup'])
+        
+        return products
+    
+    def get_products_info(self, codes: Iterable, key_field: Optional[str] = None,
+                          fields: Optional[List[str]] = None, table: Optional[str] = None) -> Dict[str, Dict]:
+        """
+        Массовое получение информации о товарах
+        
+        Args:
+            codes: Коды товаров
+            key_field: Поле, по которому ищем (по умолчанию DATABASE_CODE_FIELD)
+            fields: Дополнительные поля (по умолчанию DATABASE_PRICE_FIELD)
+            table: Таблица товаров (по умолчанию DATABASE_PRODUCTS_TABLE)
+            
+        Returns:
+            Dict[str, Dict]: Код -> {поле: значение} только для найденных товаров
+        """
+        if not self.connection:
+            logger.error("Нет подключения к БД")
+            return {}
+        
+        key_field = key_field or self.code_field
+        fields = tuple(fields) if fields is not None else (self.price_field,)
+        codes = list(dict.fromkeys(codes))
+        
+        cursor = None
         try:
-            if self.db_type.lower() == 'mysql':
-                self.connection = mysql.connector.connect(
-                    host=self.db_host,
-                    port=self.db_port,
-                    database=self.db_name,
-                    user=self.db_user,
-                    password=self.db_password,
-                    charset='utf8mb4',
-                    autocommit=False
-                )
-                
-            elif self.db_type.lower() == 'postgresql':
-                self.connection = psycopg2.connect(
-                    host=self.db_host,
-                    port=self.db_port,
-                    database=self.db_name,
-                    user=self.db_user,
-                    password=self.db_password
-                )
-                self.connection.autocommit = False
-                
-            elif self.db_type.lower() == 'sqlite':
-                self.connection = sqlite3.connect(self.db_name)
-                self.connection.execute("PRAGMA foreign_keys = ON")
-                
-            else:
-                logger.error(f"Unsupported database type: {self.db_type}")
-                return False
+            cursor = self.connection.cursor()
+            products = self._lookup_products(cursor, codes, key_field, fields, table)
+            logger.info(f"Найдено {len(products)} из {len(codes)} товаров")
+            return products
             
-            logger.info(f"Successfully connected to database {self.db_type}")
+        except Exception as e:
+            logger.error(f"Ошибка при получении информации о товарах: {e}")
+            self.connection.rollback()
+            return {}
+        finally:
+            if cursor:
+                cursor.close()
+    
+    def _statement_cursor(self, name: str):
+        """
+        Курсор для оператора из self.statements. Для MySQL - серверный prepared-курсор,
+        один на оператор и соединение: повторные вызовы не разбирают SQL заново.
+        """
+        if self.use_prepared and self.db_type.lower() == 'mysql':
+            cursor = self._prepared_cursors.get(name)
+            if cursor is None:
+                cursor = self.connection.cursor(prepared=True)
+                self._prepared_cursors[name] = cursor
+            return cursor
+        
+        return self.connection.cursor()
+    
+    def _release_cursor(self, name: str, cursor):
+        if self._prepared_cursors.get(name) is not cursor:
+            cursor.close()
+    
+    def _close_prepared_cursors(self):
+        for cursor in self._prepared_cursors.values():
+            try:
+                cursor.close()
+            except Exception as e:
+                logger.debug(f"Error closing prepared cursor: {e}")
+        self._prepared_cursors.clear()
+    
+    def _open_connection(self):
+        if self.db_type.lower() == 'mysql':
+            connection = mysql.connector.connect(
+                host=self.db_host,
+                port=self.db_port,
+                database=self.db_name,
+                user=self.db_user,
+                password=self.db_password,
+                charset='utf8mb4',
+                autocommit=False
+            )
+            
+        elif self.db_type.lower() == 'postgresql':
+            connection = psycopg2.connect(
+                host=self.db_host,
+                port=self.db_port,
+                database=self.db_name,
+                user=self.db_user,
+                password=self.db_password
+            )
+            connection.autocommit = False
+            
+        elif self.db_type.lower() == 'sqlite':
+            # Соединение может быть выдано пулом в другом потоке
+            connection = sqlite3.connect(self.db_name, check_same_thread=False)
+            connection.execute("PRAGMA foreign_keys = ON")
+            
+        else:
+            raise ValueError(f"Unsupported database type: {self.db_type}")
+        
+        logger.info(f"Successfully connected to database {self.db_type}")
+        return connection
+    
+    def _get_pool(self) -> ConnectionPool:
+        key = (self.db_type.lower(), self.db_host, self.db_port, self.db_name, self.db_user)
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(self._open_connection, self.pool_size, self.pool_idle_timeout)
+                _pools[key] = pool
+            return pool
+    
+    def connect(self) -> bool:
+        if self.connection:
+            return True
+        
+        try:
+            self.connection = self._get_pool().acquire()
             return True
             
         except Exception as e:
@@ -61,12 +373,34 @@ class DatabaseUpdater:
             return False
     
     def disconnect(self):
+        """Возвращает соединение в пул; закрывать его физически будет пул"""
         if self.connection:
+            self._close_prepared_cursors()
             try:
-                self.connection.close()
-                logger.info("Database connection closed")
+                self._get_pool().release(self.connection)
+                logger.debug("Database connection returned to pool")
             except Exception as e:
                 logger.error(f"Error closing connection: {e}")
+            finally:
+                self.connection = None
+    
+    @staticmethod
+    def close_pools():
+        """Физически закрывает все соединения во всех пулах"""
+        with _pools_lock:
+            pools = list(_pools.values())
+        
+        for pool in pools:
+            pool.close_all()
+        logger.info("Database connection pools closed")
+    
+    def __enter__(self) -> 'DatabaseUpdater':
+        if not self.connect():
+            raise ConnectionError(f"Failed to connect to database {self.db_type}")
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.disconnect()
     
     def update_single_price(self, code_1c: str, price: Union[str, float], 
                            discount: Optional[Union[str, float]] = None,
@@ -75,32 +409,16 @@ class DatabaseUpdater:
             logger.error("No database connection")
             return False
         
+        cursor = None
         try:
-            cursor = self.connection.cursor()
-            
-            update_fields = [f"{self.price_field} = %s"]
-            values = [float(price)]
+            cursor = self._statement_cursor('update_price')
+            values = (float(price), code_1c)
             
             # Убираем поля discount и discount_price - их нет в oc_product
             
-            # Добавляем условие WHERE
-            values.append(code_1c)
-            
-            # Формируем SQL запрос
-            sql = f"""
-                UPDATE {self.products_table} 
-                SET {', '.join(update_fields)}
-                WHERE {self.code_field} = %s
-            """
-            
-            # Адаптируем для SQLite (использует ? вместо %s)
-            if self.db_type.lower() == 'sqlite':
-                sql = sql.replace('%s', '?')
-            
-            logger.debug(f"SQL: {sql}")
             logger.debug(f"Values: {values}")
             
-            cursor.execute(sql, values)
+            cursor.execute(self.statements['update_price'], values)
             
             # Проверяем, был ли обновлен товар
             if cursor.rowcount == 0:
@@ -118,19 +436,149 @@ class DatabaseUpdater:
             return False
         finally:
             if cursor:
-                cursor.close()
+                self._release_cursor('update_price', cursor)
+    
+    def _stage_prices(self, cursor, prices: Dict[str, float]):
+        """Загружает пары (code, price) во временную таблицу одной пачкой"""
+        rows = list(prices.items())
+        
+        cursor.execute(self.statements['drop_staging'])
+        cursor.execute(self.statements['create_staging'])
+        if 'index_staging' in self.statements:
+            cursor.execute(self.statements['index_staging'])
+        
+        if self.db_type.lower() == 'postgresql':
+            execute_values(cursor, self.statements['insert_staging'], rows, page_size=1000)
+        else:
+            # mysql.connector переписывает executemany для INSERT в многострочный VALUES
+            cursor.executemany(self.statements['insert_staging'], rows)
+    
+    def _apply_staged_prices(self, cursor) -> List[str]:
+        """
+        Обновляет цены одним UPDATE ... JOIN из временной таблицы
+        
+        Returns:
+            List[str]: Коды из временной таблицы, которых нет в таблице товаров
+        """
+        cursor.execute(self.statements['missing_staged'])
+        missing_codes = [row[0] for row in cursor.fetchall()]
+        
+        cursor.execute(self.statements['apply_staged'])
+        cursor.execute(self.statements['drop_staging'])
+        
+        return missing_codes
+    
+    def _fetch_current_prices(self, cursor, codes: List[str]) -> Dict[str, Optional[float]]:
+        """
+        Читает текущие цены для списка кодов (см. _lookup_products)
+        
+        Returns:
+            Dict[str, Optional[float]]: Код -> текущая цена (только найденные товары)
+        """
+        products = self._lookup_products(cursor, codes, self.code_field, (self.price_field,))
+        return {
+            code: float(product[self.price_field]) if product[self.price_field] is not None else None
+            for code, product in products.items()
+        }
+    
+    def _write_prices_chunk(self, cursor, prices: Dict[str, float]) -> Tuple[Set[str], Set[str]]:
+        """
+        Записывает одну пачку цен (без commit)
+        
+        Returns:
+            Tuple[Set[str], Set[str]]: Коды, не найденные в БД, и коды с неизменившейся ценой
+        """
+        missing_codes = set()
+        unchanged_codes = set()
+        
+        if self.skip_unchanged:
+            # Пишем только изменившиеся цены: лишние UPDATE дают блокировки,
+            # объем binlog и сброс кэшей на стороне магазина
+            current = self._fetch_current_prices(cursor, list(prices))
+            
+            for code_1c, price in prices.items():
+                if code_1c not in current:
+                    missing_codes.add(code_1c)
+                elif current[code_1c] is not None and abs(current[code_1c] - price) <= self.price_tolerance:
+                    unchanged_codes.add(code_1c)
+            
+            prices = {
+                code_1c: price for code_1c, price in prices.items()
+                if code_1c not in missing_codes and code_1c not in unchanged_codes
+            }
+        
+        if prices:
+            self._stage_prices(cursor, prices)
+            missing_codes.update(self._apply_staged_prices(cursor))
+        
+        return missing_codes, unchanged_codes
+    
+    @staticmethod
+    def _prices_fingerprint(prices: Dict[str, float]) -> str:
+        return hashlib.sha1(json.dumps(list(prices.items())).encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def _checkpoint_path(name: Optional[str]) -> str:
+        checkpoint_file = Config.DATABASE_CHECKPOINT_FILE or os.path.join(
+            Config.DOWNLOAD_DIR, 'price_update_checkpoint.json'
+        )
+        if not name:
+            return checkpoint_file
+        
+        # Параллельные источники не должны перезаписывать и удалять чужие контрольные точки
+        root, extension = os.path.splitext(checkpoint_file)
+        return f"{root}_{name}{extension}"
+    
+    def _load_checkpoint(self, fingerprint: str) -> Optional[Dict]:
+        """Загружает контрольную точку, если она относится к этому же набору цен"""
+        try:
+            with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать контрольную точку {self.checkpoint_file}: {e}")
+            return None
+        
+        if checkpoint.get('fingerprint') != fingerprint:
+            logger.info("Контрольная точка относится к другому набору цен, начинаем сначала")
+            return None
+        
+        return checkpoint
+    
+    def _save_checkpoint(self, checkpoint: Dict):
+        os.makedirs(os.path.dirname(os.path.abspath(self.checkpoint_file)), exist_ok=True)
+        tmp_file = f"{self.checkpoint_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_file, self.checkpoint_file)
+    
+    def _clear_checkpoint(self):
+        try:
+            os.remove(self.checkpoint_file)
+        except FileNotFoundError:
+            pass
     
     def update_prices_batch(self, price_updates: List[Dict]) -> Dict[str, int]:
         """
         Массовое обновление цен в БД
         
+        Цены загружаются во временную таблицу пачками по DATABASE_COMMIT_CHUNK_SIZE
+        (executemany / execute_values) и применяются одним UPDATE ... JOIN на пачку,
+        вместо запроса на каждую строку. Каждая пачка коммитится отдельно, после
+        коммита сохраняется контрольная точка: прерванный запуск с теми же данными
+        продолжит с первой незакоммиченной пачки. Ошибка драйвера откатывает только
+        свою пачку. Цены, совпадающие с текущими в пределах DATABASE_PRICE_TOLERANCE,
+        не записываются.
+        
         Args:
             price_updates: Список обновлений в формате [{"code_1c": "...", "price": "..."}]
             
         Returns:
-            Dict[str, int]: Статистика обновлений {"success": count, "failed": count}
+            Dict[str, int]: Статистика обновлений {"success": count, "unchanged": count, "failed": count}
         """
-        stats = {"success": 0, "failed": 0}
+        stats = {"success": 0, "unchanged": 0, "failed": 0}
+        self.last_failed_codes = {update.get('code_1c') for update in price_updates if update.get('code_1c')}
         
         if not self.connection:
             logger.error("Нет подключения к БД")
@@ -139,62 +587,102 @@ class DatabaseUpdater:
         
         logger.info(f"Начало массового обновления {len(price_updates)} цен в БД")
         
+        # Код -> цена; при повторах кода побеждает последнее значение
+        prices = {}
+        row_codes = []
+        
+        for update in price_updates:
+            code_1c = update.get('code_1c')
+            price = update.get('price')
+            
+            if not code_1c or not price:
+                logger.warning("Пропущено обновление: отсутствует code_1c или price")
+                stats["failed"] += 1
+                continue
+            
+            try:
+                prices[code_1c] = float(price)
+            except (TypeError, ValueError) as e:
+                logger.error(f"Ошибка при обновлении {code_1c}: {e}")
+                stats["failed"] += 1
+                continue
+            
+            row_codes.append(code_1c)
+        
+        if not prices:
+            return stats
+        
+        self.last_failed_codes -= set(prices)
+        codes = list(prices)
+        fingerprint = self._prices_fingerprint(prices)
+        checkpoint = self._load_checkpoint(fingerprint) or {
+            'fingerprint': fingerprint,
+            'committed': 0,
+            'missing': [],
+            'unchanged': [],
+            'errors': []
+        }
+        
+        if checkpoint['committed']:
+            logger.info(f"Продолжаем с контрольной точки: уже обработано {checkpoint['committed']} из {len(codes)} кодов")
+        
+        missing_codes = set(checkpoint['missing'])
+        unchanged_codes = set(checkpoint['unchanged'])
+        error_codes = set(checkpoint['errors'])
+        
+        cursor = None
         try:
             cursor = self.connection.cursor()
             
-            for update in price_updates:
+            for start in range(checkpoint['committed'], len(codes), self.commit_chunk_size):
+                chunk_codes = codes[start:start + self.commit_chunk_size]
+                chunk = {code_1c: prices[code_1c] for code_1c in chunk_codes}
+                
                 try:
-                    code_1c = update.get('code_1c')
-                    price = update.get('price')
-                    discount = update.get('discount')
-                    discount_price = update.get('discountPrice')
-                    
-                    if not code_1c or not price:
-                        logger.warning("Пропущено обновление: отсутствует code_1c или price")
-                        stats["failed"] += 1
-                        continue
-                    
-                    # Формируем запрос для каждого товара
-                    update_fields = [f"{self.price_field} = %s"]
-                    values = [float(price)]
-                    
-                    # Убираем поля discount и discount_price - их нет в oc_product
+                    chunk_missing, chunk_unchanged = self._write_prices_chunk(cursor, chunk)
+                    self.connection.commit()
+                    missing_codes.update(chunk_missing)
+                    unchanged_codes.update(chunk_unchanged)
                     
-                    values.append(code_1c)
-                    
-                    sql = f"""
-                        UPDATE {self.products_table} 
-                        SET {', '.join(update_fields)}
-                        WHERE {self.code_field} = %s
-                    """
-                    
-                    if self.db_type.lower() == 'sqlite':
-                        sql = sql.replace('%s', '?')
-                    
-                    cursor.execute(sql, values)
-                    
-                    if cursor.rowcount > 0:
-                        stats["success"] += 1
-                    else:
-                        logger.warning(f"Товар {code_1c} не найден в БД")
-                        stats["failed"] += 1
-                
                 except Exception as e:
-                    logger.error(f"Ошибка при обновлении {code_1c}: {e}")
+                    logger.error(f"Ошибка при записи пачки {start}-{start + len(chunk_codes)}: {e}")
+                    self.connection.rollback()
+                    error_codes.update(chunk_codes)
+                
+                checkpoint.update({
+                    'committed': start + len(chunk_codes),
+                    'missing': sorted(missing_codes),
+                    'unchanged': sorted(unchanged_codes),
+                    'errors': sorted(error_codes)
+                })
+                self._save_checkpoint(checkpoint)
+            
+            self._clear_checkpoint()
+            self.last_failed_codes |= missing_codes | error_codes
+            
+            for code_1c in row_codes:
+                if code_1c in missing_codes or code_1c in error_codes:
                     stats["failed"] += 1
-                    continue
+                elif code_1c in unchanged_codes:
+                    stats["unchanged"] += 1
+                else:
+                    stats["success"] += 1
             
-            # Коммитим все изменения
-            self.connection.commit()
+            for code_1c in missing_codes:
+                logger.warning(f"Товар {code_1c} не найден в БД")
             
-            logger.info(f"Массовое обновление завершено. Успешно: {stats['success']}, ошибок: {stats['failed']}")
+            logger.info(f"Массовое обновление завершено. Успешно: {stats['success']}, "
+                        f"без изменений: {stats['unchanged']}, ошибок: {stats['failed']}")
             return stats
             
         except Exception as e:
             logger.error(f"Критическая ошибка при массовом обновлении: {e}")
             if self.connection:
                 self.connection.rollback()
+            stats["success"] = 0
+            stats["unchanged"] = 0
             stats["failed"] = len(price_updates)
+            self.last_failed_codes |= set(prices)
             return stats
         finally:
             if cursor:
@@ -214,19 +702,10 @@ class DatabaseUpdater:
             logger.error("Нет подключения к БД")
             return None
         
+        cursor = None
         try:
-            cursor = self.connection.cursor()
-            
-            sql = f"""
-                SELECT {self.code_field}, {self.price_field}
-                FROM {self.products_table}
-                WHERE {self.code_field} = %s
-            """
-            
-            if self.db_type.lower() == 'sqlite':
-                sql = sql.replace('%s', '?')
-            
-            cursor.execute(sql, (code_1c,))
+            cursor = self._statement_cursor('select_product')
+            cursor.execute(self.statements['select_product'], (code_1c,))
             result = cursor.fetchone()
             
             if result:
@@ -240,7 +719,7 @@ class DatabaseUpdater:
             return None
         finally:
             if cursor:
-                cursor.close()
+                self._release_cursor('select_product', cursor)
     
     def test_connection(self) -> bool:
         """
@@ -249,6 +728,9 @@ class DatabaseUpdater:
         Returns:
             bool: True если соединение успешно
         """
+        # Соединение, взятое вызывающим кодом, не возвращаем в пул за него
+        was_connected = self.connection is not None
+        
         try:
             if not self.connect():
                 return False
@@ -276,7 +758,8 @@ class DatabaseUpdater:
             logger.error(f"Ошибка тестирования соединения с БД: {e}")
             return False
         finally:
-            self.disconnect()
+            if not was_connected:
+                self.disconnect()
     
     def get_products_count(self) -> int:
         """
@@ -289,11 +772,10 @@ class DatabaseUpdater:
             logger.error("Нет подключения к БД")
             return 0
         
+        cursor = None
         try:
             cursor = self.connection.cursor()
-            
-            sql = f"SELECT COUNT(*) FROM {self.products_table}"
-            cursor.execute(sql)
+            cursor.execute(self.statements['count_products'])
             result = cursor.fetchone()
             
             return result[0] if result else 0
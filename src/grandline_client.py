@@ -1,54 +1,231 @@
-import requests
+import time
 import logging
-from typing import List, Dict, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Any, List, Dict, Optional, Iterator, Iterable, Callable, Set, Tuple
+import requests
+from requests.adapters import HTTPAdapter
 from config import Config
+from src.nomenclature_cache import NomenclatureCache
 
 logger = logging.getLogger(__name__)
 
+class RateLimiter:
+    """Token bucket: не более rate запросов в секунду, с запасом burst"""
+    
+    def __init__(self, rate: float, burst: int = 1):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                # Пауза после 429 действует и без лимита темпа (rate <= 0)
+                if now < self.blocked_until:
+                    wait_time = self.blocked_until - now
+                elif self.max_rate <= 0:
+                    return
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+    
+    def throttle(self, pause: float):
+        """Реакция на 429: приостанавливаем выдачу токенов и вдвое снижаем темп"""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+            self.tokens = 0.0
+            if self.max_rate > 0:
+                self.rate = max(self.max_rate / 8, self.rate / 2)
+    
+    def recover(self):
+        """После успешного запроса постепенно возвращаем темп к настроенному"""
+        if self.rate < self.max_rate:
+            with self.lock:
+                self.rate = min(self.max_rate, self.rate * 1.1)
+
+
+def _retry_after_seconds(response) -> Optional[float]:
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
 class GrandLineClient:
     
+    RETRY_STATUS_CODES = (429, 502, 503)
+    
     def __init__(self):
         self.api_key = Config.GRANDLINE_API_KEY
         self.branch_id = Config.GRANDLINE_BRANCH_ID
         self.agreement_id = Config.GRANDLINE_AGREEMENT_ID
         self.base_url = Config.GRANDLINE_BASE_URL
+        self.page_size = Config.GRANDLINE_PAGE_SIZE
+        self.concurrency = max(1, Config.GRANDLINE_CONCURRENCY)
+        self.max_retries = max(1, Config.GRANDLINE_MAX_RETRIES)
+        self.rate_limiter = RateLimiter(Config.GRANDLINE_RATE_LIMIT, Config.GRANDLINE_RATE_BURST)
+        self.nomenclature_cache = NomenclatureCache()
         self.session = requests.Session()
         
+        # Пул соединений под параллельную загрузку страниц
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
         self.session.headers.update({
             'Content-Type': 'application/json'
         })
     
+    def _request(self, url: str, params: Dict) -> requests.Response:
+        """GET с учетом бюджета запросов и повторами для 429/502/503"""
+        for attempt in range(self.max_retries):
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.get(url, params=params, timeout=30)
+                response.raise_for_status()
+                self.rate_limiter.recover()
+                return response
+            except requests.exceptions.HTTPError as e:
+                status_code = e.response.status_code if e.response is not None else None
+                if status_code not in self.RETRY_STATUS_CODES or attempt >= self.max_retries - 1:
+                    raise
+                
+                wait_time = _retry_after_seconds(e.response)
+                if wait_time is None:
+                    wait_time = (5 if status_code == 429 else 2) * 2 ** attempt
+                
+                logger.warning(f"{status_code} error at offset={params.get('offset')}, retrying in "
+                               f"{wait_time:.1f} seconds... (attempt {attempt + 1}/{self.max_retries})")
+                
+                if status_code == 429:
+                    # Пауза общая для всех потоков, иначе соседние запросы снова получат 429
+                    self.rate_limiter.throttle(wait_time)
+                else:
+                    time.sleep(wait_time)
+    
+    def _fetch_page(self, url: str, params: Dict, extract: Callable) -> Optional[List[Dict]]:
+        response = self._request(url, params)
+        return extract(response.json(), params)
+    
+    def _iter_pages(self, url: str, params: Dict, extract: Callable,
+                    page_size: Optional[int] = None) -> Iterator[List[Dict]]:
+        """
+        Загружает страницы по offset параллельно (до self.concurrency запросов в полете)
+        и отдает их строго по порядку. Останавливается на первой неполной странице.
+        Ошибка на первой странице дает пустой результат, на любой следующей - исключение.
+        """
+        limit = page_size or self.page_size
+        next_offset = 0
+        pending = {}
+        exhausted = False
+        
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='grandline')
+        try:
+            while True:
+                while not exhausted and len(pending) < self.concurrency:
+                    page_params = dict(params, limit=limit, offset=next_offset)
+                    pending[next_offset] = executor.submit(self._fetch_page, url, page_params, extract)
+                    next_offset += limit
+                
+                if not pending:
+                    return
+                
+                offset = min(pending)
+                items = pending.pop(offset).result()
+                
+                # Ошибка API посреди обхода: молча остановиться значит отдать урезанный каталог
+                if items is None and offset > 0:
+                    raise RuntimeError(f"GrandLine API returned an invalid page from {url} at offset {offset}")
+                
+                if items:
+                    logger.info(f"Received {len(items)} items from {url} at offset {offset}")
+                    yield items
+                
+                # Неполная страница (или ошибка на первой странице) - дальше данных нет
+                if items is None or len(items) < limit:
+                    exhausted = True
+                    for future in pending.values():
+                        future.cancel()
+                    pending.clear()
+        finally:
+            for future in pending.values():
+                future.cancel()
+            executor.shutdown(wait=True)
+    
+    @staticmethod
+    def _extract_price_page(data, params: Dict) -> Optional[List[Dict]]:
+        # Проверяем на ошибки API
+        if isinstance(data, dict) and 'error_code' in data:
+            error_msg = data.get('error_message', 'Unknown error')
+            logger.error(f"GrandLine API error {data.get('error_code')}: {error_msg}")
+            logger.error(f"Sent parameters: {params}")
+            return None
+        
+        if not isinstance(data, list):
+            logger.error(f"Expected list, got {type(data)}")
+            return None
+        
+        return data
+    
+    @staticmethod
+    def _extract_nomenclature_page(data, params: Dict) -> Optional[List[Dict]]:
+        if not isinstance(data, dict):
+            logger.error(f"Expected dict with items, got {type(data)}")
+            return None
+        
+        return data.get('items', [])
+    
+    def iter_price_pages(self, page_size: Optional[int] = None) -> Iterator[List[Dict]]:
+        """Постранично обходит /prices/ по offset, пока каталог не закончится"""
+        url = f"{self.base_url}/prices/"
+        params = {
+            'api_key': self.api_key,
+            'branch_id': self.branch_id,
+            'agreement_id': self.agreement_id
+        }
+        
+        logger.info(f"Requesting prices from GrandLine API: {url}")
+        yield from self._iter_pages(url, params, self._extract_price_page, page_size)
+    
+    def iter_nomenclature_pages(self, page_size: Optional[int] = None) -> Iterator[List[Dict]]:
+        """Постранично обходит справочник /nomenclatures/"""
+        url = f"{self.base_url}/nomenclatures/"
+        params = {'api_key': self.api_key}
+        
+        logger.info(f"Requesting nomenclatures from GrandLine API: {url}")
+        yield from self._iter_pages(url, params, self._extract_nomenclature_page, page_size)
+    
+    def iter_prices(self, page_size: Optional[int] = None) -> Iterator[Dict]:
+        """Отдает позиции прайса по мере получения страниц"""
+        for page in self.iter_price_pages(page_size):
+            yield from page
+    
     def get_prices(self) -> List[Dict]:
         try:
-            url = f"{self.base_url}/prices/"
-            params = {
-                'api_key': self.api_key,
-                'branch_id': self.branch_id,
-                'agreement_id': self.agreement_id,
-                'limit': 20000,
-                'offset': 0
-            }
-            
-            logger.info(f"Requesting prices from GrandLine API: {url}")
-            response = self.session.get(url, params=params)
-            response.raise_for_status()
-            
-            logger.info(f"Response status: {response.status_code}")
-            logger.info(f"Response content type: {response.headers.get('content-type', 'unknown')}")
-            logger.info(f"Response text (first 500 chars): {response.text[:500]}")
-            
-            data = response.json()
-            
-            # Проверяем на ошибки API
-            if isinstance(data, dict) and 'error_code' in data:
-                error_msg = data.get('error_message', 'Unknown error')
-                logger.error(f"GrandLine API error {data.get('error_code')}: {error_msg}")
-                logger.error(f"Sent parameters: {params}")
-                return []
-            
+            data = list(self.iter_prices())
             logger.info(f"Received {len(data)} product positions")
             return data
-            
+        
         except requests.exceptions.RequestException as e:
             logger.error(f"Error requesting GrandLine API: {e}")
             raise
@@ -56,54 +233,54 @@ class GrandLineClient:
             logger.error(f"Unexpected error: {e}")
             raise
     
-    def get_nomenclatures(self, nomenclature_ids: List[str]) -> Dict[str, str]:
+    @staticmethod
+    def _match_nomenclatures(items: List[Dict], wanted: Optional[Set[str]],
+                             build: Callable[[Dict], Any], result: Dict[str, Any]) -> int:
+        """
+        Отбирает из страницы справочника нужные id_1c. wanted - заранее построенный
+        хеш-индекс (set), поэтому проверка членства O(1) вместо прохода по списку.
+        Возвращает количество добавленных записей.
+        """
+        added = 0
+        for item in items:
+            nomenclature_id = item.get('id_1c')
+            if not nomenclature_id or not item.get('code_1c'):
+                continue
+            if wanted is None or nomenclature_id in wanted:
+                if nomenclature_id not in result:
+                    added += 1
+                result[nomenclature_id] = build(item)
+        return added
+    
+    def _lookup_nomenclatures(self, nomenclature_ids: Optional[Iterable[str]],
+                              build: Callable[[Dict], Any]) -> Dict[str, Any]:
+        """Общий путь поиска по справочнику: None - весь справочник, иначе любые iterable id"""
+        wanted = None if nomenclature_ids is None else set(nomenclature_ids)
+        result = {}
+        received = 0
+        
+        pages = self.iter_nomenclature_pages()
         try:
-            url = f"{self.base_url}/nomenclatures/"
-            all_mappings = {}
-            
-            # Ограничиваем запрос только первой страницей чтобы избежать 429 ошибки
-            limit = 20000
-            offset = 0
-            
-            params = {
-                'api_key': self.api_key,
-                'limit': limit,
-                'offset': offset
-            }
-            
-            logger.info(f"Requesting nomenclatures with limit={limit}")
-            
-            # Retry логика для 502 и 429 ошибок
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    response = self.session.get(url, params=params, timeout=30)
-                    response.raise_for_status()
+            for items in pages:
+                received += len(items)
+                self._match_nomenclatures(items, wanted, build, result)
+                
+                # Все запрошенные id найдены - остальные страницы не нужны
+                if wanted is not None and len(result) >= len(wanted):
                     break
-                except requests.exceptions.HTTPError as e:
-                    if e.response.status_code in [502, 429] and attempt < max_retries - 1:
-                        wait_time = 10 if e.response.status_code == 429 else 5
-                        logger.warning(f"{e.response.status_code} error, retrying in {wait_time} seconds... (attempt {attempt + 1}/{max_retries})")
-                        import time
-                        time.sleep(wait_time)
-                        continue
-                    raise
-            
-            data = response.json()
-            items = data.get('items', [])
-            
-            logger.info(f"Received {len(items)} nomenclature items from API")
-            
-            # Обрабатываем только нужные nomenclature_ids
-            for item in items:
-                nomenclature_id = item.get('id_1c')
-                code_1c = item.get('code_1c')
-                if nomenclature_id and code_1c and nomenclature_id in nomenclature_ids:
-                    all_mappings[nomenclature_id] = code_1c
+        finally:
+            pages.close()
+        
+        logger.info(f"Received {received} nomenclature items from API")
+        return result
+    
+    def get_nomenclatures(self, nomenclature_ids: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        try:
+            all_mappings = self._lookup_nomenclatures(nomenclature_ids, lambda item: item['code_1c'])
             
             logger.info(f"Received {len(all_mappings)} nomenclature_id -> code_1c mappings")
             return all_mappings
-            
+        
         except requests.exceptions.RequestException as e:
             logger.error(f"Error requesting nomenclature: {e}")
             raise
@@ -111,60 +288,17 @@ class GrandLineClient:
             logger.error(f"Unexpected error: {e}")
             raise
     
-    def get_nomenclatures_with_names(self, nomenclature_ids: List[str]) -> Dict[str, Dict]:
+    def get_nomenclatures_with_names(self, nomenclature_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
         """Получает номенклатуры с названиями и кодами"""
         try:
-            url = f"{self.base_url}/nomenclatures/"
-            all_mappings = {}
-            
-            # Ограничиваем запрос только первой страницей чтобы избежать 429 ошибки
-            limit = 20000
-            offset = 0
-            
-            params = {
-                'api_key': self.api_key,
-                'limit': limit,
-                'offset': offset
-            }
-            
-            logger.info(f"Requesting nomenclatures with names, limit={limit}")
-            
-            # Retry логика для 502 и 429 ошибок
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    response = self.session.get(url, params=params, timeout=30)
-                    response.raise_for_status()
-                    break
-                except requests.exceptions.HTTPError as e:
-                    if e.response.status_code in [502, 429] and attempt < max_retries - 1:
-                        wait_time = 10 if e.response.status_code == 429 else 5
-                        logger.warning(f"{e.response.status_code} error, retrying in {wait_time} seconds... (attempt {attempt + 1}/{max_retries})")
-                        import time
-                        time.sleep(wait_time)
-                        continue
-                    raise
-            
-            data = response.json()
-            items = data.get('items', [])
-            
-            logger.info(f"Received {len(items)} nomenclature items from API")
-            
-            # Обрабатываем только нужные nomenclature_ids
-            for item in items:
-                nomenclature_id = item.get('id_1c')
-                code_1c = item.get('code_1c')
-                full_name = item.get('full_name', '')
-                
-                if nomenclature_id and code_1c and nomenclature_id in nomenclature_ids:
-                    all_mappings[nomenclature_id] = {
-                        'code_1c': code_1c,
-                        'name': full_name or f"Товар {code_1c}"
-                    }
+            all_mappings = self._lookup_nomenclatures(nomenclature_ids, lambda item: {
+                'code_1c': item['code_1c'],
+                'name': item.get('full_name') or f"Товар {item['code_1c']}"
+            })
             
             logger.info(f"Received {len(all_mappings)} nomenclature_id mappings with names")
             return all_mappings
-            
+        
         except requests.exceptions.RequestException as e:
             logger.error(f"Error requesting nomenclature with names: {e}")
             raise
@@ -172,66 +306,124 @@ class GrandLineClient:
             logger.error(f"Unexpected error: {e}")
             raise
     
-    def process_prices_for_update(self) -> List[Dict]:
-        try:
-            prices_data = self.get_prices()
-            
-            if not prices_data:
-                logger.warning("No price data received")
-                return []
-            
-            logger.info(f"Prices data type: {type(prices_data)}")
-            logger.info(f"Prices data content: {prices_data}")
-            
-            # Проверяем, что данные - это список
-            if not isinstance(prices_data, list):
-                logger.error(f"Expected list, got {type(prices_data)}: {prices_data}")
-                return []
-            
-            # Проверяем первый элемент
-            if prices_data and not isinstance(prices_data[0], dict):
-                logger.error(f"Expected dict items, got {type(prices_data[0])}: {prices_data[0]}")
-                return []
-            
-            nomenclature_ids = [item.get('nomenclature_id') for item in prices_data if isinstance(item, dict) and item.get('nomenclature_id')]
-            
-            if not nomenclature_ids:
-                logger.warning("No nomenclature_id found in price data")
-                return []
-            
-            nomenclature_mapping = self.get_nomenclatures(nomenclature_ids)
-            
-            update_list = []
+    def _build_update_item(self, item: Dict, nomenclature_mapping: Dict[str, str]) -> Optional[Dict]:
+        if not isinstance(item, dict):
+            logger.error(f"Expected dict items, got {type(item)}: {item}")
+            return None
+        
+        nomenclature_id = item.get('nomenclature_id')
+        price = item.get('price')
+        discount = item.get('discount')
+        discount_price = item.get('discountPrice')
+        
+        if not nomenclature_id or not price:
+            return None
+        
+        code_1c = nomenclature_mapping.get(nomenclature_id)
+        if not code_1c:
+            logger.warning(f"No code_1c found for nomenclature_id: {nomenclature_id}")
+            return None
+        
+        update_item = {
+            'code_1c': code_1c,
+            'price': str(price)
+        }
+        
+        if discount:
+            update_item['discount'] = str(discount)
+        if discount_price:
+            update_item['discountPrice'] = str(discount_price)
+        
+        return update_item
+    
+    def _fetch_missing_codes(self, missing_ids: Set[str],
+                             pages: Iterator[List[Dict]]) -> Tuple[Dict[str, str], bool]:
+        """
+        Продолжает обход справочника, пока не найдет все недостающие id, попутно
+        сохраняя каждую страницу в кэш. Возвращает найденные соответствия и признак
+        того, что справочник пройден до конца.
+        """
+        found = {}
+        
+        for items in pages:
+            self.nomenclature_cache.put_many(items)
+            self._match_nomenclatures(items, missing_ids, lambda item: item['code_1c'], found)
             
-            for item in prices_data:
-                nomenclature_id = item.get('nomenclature_id')
-                price = item.get('price')
-                discount = item.get('discount')
-                discount_price = item.get('discountPrice')
+            if len(found) >= len(missing_ids):
+                return found, False
+        
+        return found, True
+    
+    def map_price_pages(self, pages: Iterable[List[Dict]]) -> Iterator[List[Dict]]:
+        """Превращает страницы прайса в страницы обновлений (nomenclature_id -> code_1c)"""
+        # Обход справочника ленивый и продолжается с места остановки: на теплом кэше
+        # запросов к /nomenclatures/ нет совсем, на холодном справочник проходится один раз.
+        # id, которых нет и в полном справочнике, кэшируются как отсутствующие на тот же TTL
+        nomenclature_pages = None
+        directory_walked = False
+        
+        try:
+            for page in pages:
+                page_ids = {
+                    item.get('nomenclature_id') for item in page
+                    if isinstance(item, dict) and item.get('nomenclature_id')
+                }
                 
-                if not nomenclature_id or not price:
-                    continue
+                nomenclature_mapping = self.nomenclature_cache.get_many(page_ids)
+                missing = page_ids - nomenclature_mapping.keys()
+                if missing:
+                    missing -= self.nomenclature_cache.get_absent(missing)
                 
-                code_1c = nomenclature_mapping.get(nomenclature_id)
-                if not code_1c:
-                    logger.warning(f"No code_1c found for nomenclature_id: {nomenclature_id}")
-                    continue
+                if missing and not directory_walked:
+                    logger.info(f"Nomenclature cache misses on page: {len(missing)}, fetching from API")
+                    if nomenclature_pages is None:
+                        nomenclature_pages = self.iter_nomenclature_pages()
+                    found, directory_walked = self._fetch_missing_codes(missing, nomenclature_pages)
+                    nomenclature_mapping.update(found)
+                    missing -= found.keys()
+                    
+                    if directory_walked:
+                        # Весь справочник теперь в кэше с новой отметкой времени - старые записи не нужны
+                        purged = self.nomenclature_cache.purge_expired()
+                        if purged:
+                            logger.info(f"Purged {purged} expired nomenclature cache entries")
                 
-                update_item = {
-                    'code_1c': code_1c,
-                    'price': str(price)
-                }
+                if missing and directory_walked:
+                    # Справочник пройден до конца: этих id в нем нет, следующие запуски не ищут их заново
+                    self.nomenclature_cache.put_absent(missing)
+                    logger.warning(f"{len(missing)} nomenclature ids are not in the directory, "
+                                   f"cached as absent")
                 
-                if discount:
-                    update_item['discount'] = str(discount)
-                if discount_price:
-                    update_item['discountPrice'] = str(discount_price)
+                update_page = []
+                for item in page:
+                    update_item = self._build_update_item(item, nomenclature_mapping)
+                    if update_item:
+                        update_page.append(update_item)
                 
-                update_list.append(update_item)
+                logger.info(f"Prepared {len(update_page)} of {len(page)} positions from page")
+                if update_page:
+                    yield update_page
+        finally:
+            if nomenclature_pages is not None:
+                nomenclature_pages.close()
+    
+    def iter_prices_for_update(self, page_size: Optional[int] = None) -> Iterator[List[Dict]]:
+        """Отдает подготовленные обновления цен постранично, по мере загрузки прайса"""
+        return self.map_price_pages(self.iter_price_pages(page_size))
+    
+    def process_prices_for_update(self) -> List[Dict]:
+        try:
+            update_list = []
+            for update_page in self.iter_prices_for_update():
+                update_list.extend(update_page)
+            
+            if not update_list:
+                logger.warning("No price data received")
+                return []
             
             logger.info(f"Prepared {len(update_list)} positions for price update")
             return update_list
-            
+        
         except Exception as e:
             logger.error(f"Error processing prices for update: {e}")
             raise
@@ -250,7 +442,7 @@ class GrandLineClient:
             
             logger.info("GrandLine API connection successful")
             return True
-            
+        
         except requests.exceptions.HTTPError as e:
             logger.error(f"GrandLine API HTTP error: {e}")
             if hasattr(e, 'response') and e.response is not None:
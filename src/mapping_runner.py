@@ -0,0 +1,83 @@
+"""
+Параллельное сопоставление с OpenCart: товары GrandLine делятся на диапазоны,
+которые обрабатываются в пуле процессов
+"""
+import gc
+import os
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, List, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Индекс OpenCart для рабочих процессов. Задается до создания пула, и процессы,
+# запущенные через fork, получают его без сериализации - страницы памяти общие
+# (copy-on-write) и копируются, только когда процесс в них пишет.
+_matcher = None
+
+def _match_shard(start: int, items: List[str], min_similarity: float):
+    return start, list(_matcher.iter_matches(items, min_similarity))
+
+def _worker_count(workers: Optional[int]) -> int:
+    if workers is None:
+        workers = Config.MAPPING_WORKERS
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    
+    # Без fork каждый процесс получил бы свою копию индекса через pickle
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return 1
+    return workers
+
+def run_sharded(matcher, items: List[str], min_similarity: float,
+                workers: Optional[int] = None, shard_size: Optional[int] = None) -> List[Optional[Any]]:
+    """
+    Сопоставляет items через matcher.iter_matches в MAPPING_WORKERS процессах.
+    
+    Returns:
+        List[Optional[Any]]: Результаты в порядке items - не зависят ни от числа
+        процессов, ни от порядка завершения диапазонов
+    """
+    global _matcher
+    
+    shard_size = shard_size or Config.MAPPING_SHARD_SIZE
+    starts = range(0, len(items), shard_size)
+    workers = min(_worker_count(workers), len(starts))
+    
+    results: List[Optional[Any]] = [None] * len(items)
+    done = 0
+    started = time.monotonic()
+    
+    def collect(start: int, shard_results: List[Optional[Any]]):
+        nonlocal done
+        results[start:start + len(shard_results)] = shard_results
+        done += len(shard_results)
+        elapsed = time.monotonic() - started
+        logger.info(f"Сопоставлено {done}/{len(items)} ({done / elapsed if elapsed else 0:.0f} в сек)")
+    
+    if workers <= 1:
+        for start in starts:
+            collect(start, list(matcher.iter_matches(items[start:start + shard_size], min_similarity)))
+        return results
+    
+    logger.info(f"Сопоставление {len(items)} товаров в {workers} процессах, диапазонов: {len(starts)}")
+    _matcher = matcher
+    # Объекты индекса переносятся в постоянное поколение: сборщик мусора в дочерних
+    # процессах не обходит их и не копирует страницы памяти
+    gc.freeze()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as executor:
+            futures = [
+                executor.submit(_match_shard, start, items[start:start + shard_size], min_similarity)
+                for start in starts
+            ]
+            for future in as_completed(futures):
+                collect(*future.result())
+    finally:
+        gc.unfreeze()
+        _matcher = None
+    
+    return results
@@ -0,0 +1,127 @@
+"""
+Отпечатки товаров последнего сопоставления для инкрементального пересчета соответствий
+"""
+import os
+import sqlite3
+import hashlib
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Optional, Set, Tuple
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Таблица oc_grandline_mapping общая для сопоставления по кодам и по названиям:
+# каждый сценарий читает, удаляет и перезаписывает только строки своих mapping_method
+SCOPE_METHODS = {
+    'codes': ('exact', 'suffix', 'prefix', 'similarity'),
+    'names': ('name_similarity',),
+}
+
+class MappingState:
+    """
+    Хранит для каждой стороны (grandline, opencart) отпечатки кода и названия
+    товаров, участвовавших в последнем успешном сопоставлении. scope разделяет
+    сопоставление по кодам ('codes') и по названиям ('names').
+    """
+    
+    GRANDLINE = 'grandline'
+    OPENCART = 'opencart'
+    
+    def __init__(self, scope: str, path: Optional[str] = None):
+        self.scope = scope
+        self.path = path or Config.MAPPING_STATE_FILE or os.path.join(Config.DOWNLOAD_DIR, 'mapping_state.db')
+        
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                scope TEXT NOT NULL,
+                side TEXT NOT NULL,
+                item_key TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (scope, side, item_key)
+            )
+        """)
+        self.connection.commit()
+    
+    @staticmethod
+    def fingerprint(*parts) -> str:
+        return hashlib.sha1('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    
+    def load(self, side: str) -> Dict[str, str]:
+        rows = self.connection.execute(
+            "SELECT item_key, hash FROM fingerprints WHERE scope = ? AND side = ?", (self.scope, side)
+        )
+        return dict(rows)
+    
+    def is_empty(self) -> bool:
+        row = self.connection.execute(
+            "SELECT 1 FROM fingerprints WHERE scope = ? LIMIT 1", (self.scope,)
+        ).fetchone()
+        return row is None
+    
+    def plan(self, grandline: Dict[str, str], opencart: Dict[str, str],
+             mappings: Dict[str, Tuple[str, float]]) -> Tuple[Set[str], Set[str], Set[str]]:
+        """
+        Определяет, что нужно пересчитать относительно последнего запуска
+        
+        Args:
+            grandline: Текущие отпечатки GrandLine (код -> отпечаток)
+            opencart: Текущие отпечатки OpenCart (модель -> отпечаток)
+            mappings: Сохраненные соответствия (код GrandLine -> (модель OpenCart, схожесть))
+        
+        Returns:
+            Tuple[Set[str], Set[str], Set[str]]: Коды GrandLine для сопоставления со всем
+            каталогом (новые, изменившиеся и сопоставленные с изменившимися или удаленными
+            товарами OpenCart); новые и изменившиеся модели OpenCart, с которыми
+            сопоставляются остальные коды; коды, пропавшие из GrandLine
+        """
+        previous_grandline = self.load(self.GRANDLINE)
+        previous_opencart = self.load(self.OPENCART)
+        
+        changed_opencart = {model for model, fingerprint in opencart.items() if previous_opencart.get(model) != fingerprint}
+        removed_opencart = set(previous_opencart) - set(opencart)
+        
+        rescore = {code for code, fingerprint in grandline.items() if previous_grandline.get(code) != fingerprint}
+        rescore.update(
+            code for code, (model, _) in mappings.items()
+            if code in grandline and (model in changed_opencart or model in removed_opencart)
+        )
+        removed_grandline = set(previous_grandline) - set(grandline)
+        
+        logger.info(f"Инкрементальное сопоставление: GrandLine к пересчету {len(rescore)} из {len(grandline)}, "
+                    f"удалено {len(removed_grandline)}; OpenCart новых и измененных {len(changed_opencart)}, "
+                    f"удалено {len(removed_opencart)}")
+        return rescore, changed_opencart, removed_grandline
+    
+    def save(self, grandline: Dict[str, str], opencart: Dict[str, str]):
+        """Заменяет отпечатки обеих сторон после успешной записи соответствий"""
+        with self.connection:
+            self.connection.execute("DELETE FROM fingerprints WHERE scope = ?", (self.scope,))
+            for side, fingerprints in ((self.GRANDLINE, grandline), (self.OPENCART, opencart)):
+                self.connection.executemany(
+                    "INSERT INTO fingerprints (scope, side, item_key, hash) VALUES (?, ?, ?, ?)",
+                    ((self.scope, side, key, fingerprint) for key, fingerprint in fingerprints.items())
+                )
+    
+    def close(self):
+        self.connection.close()
+
+def scope_condition(scope: str) -> str:
+    """SQL-условие на строки oc_grandline_mapping, записанные сценарием scope"""
+    return "mapping_method IN (" + ", ".join(f"'{method}'" for method in SCOPE_METHODS[scope]) + ")"
+
+def stored_score(similarity: float) -> float:
+    """Схожесть так, как ее сохраняет similarity_score DECIMAL(3,2): два знака, половина - вверх"""
+    return float(Decimal(repr(similarity)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+
+def load_mappings(cursor, scope: str) -> Dict[str, Tuple[str, float]]:
+    """Сохраненные соответствия сценария scope: код GrandLine -> (модель OpenCart, схожесть)"""
+    cursor.execute(
+        "SELECT grandline_code, opencart_model, similarity_score FROM oc_grandline_mapping "
+        f"WHERE {scope_condition(scope)}"
+    )
+    return {code: (model, float(score or 0)) for code, model, score in cursor.fetchall()}
@@ -0,0 +1,241 @@
+"""
+Сопоставление товаров по названиям через инвертированный индекс слов
+"""
+import re
+import math
+import heapq
+import logging
+from operator import itemgetter
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+from config import Config
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    # Векторный поиск по названиям необязателен: без numpy/scipy работает NameMatcher
+    np = None
+    sparse = None
+
+logger = logging.getLogger(__name__)
+
+STOP_WORDS = {'товар', 'изделие', 'продукт', 'материал', 'деталь'}
+
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+_SPACES_RE = re.compile(r'\s+')
+
+def clean_name(name):
+    """Очистка названия для лучшего сравнения"""
+    if not name:
+        return ""
+    
+    # Приводим к нижнему регистру, убираем лишние пробелы и символы
+    name = _PUNCTUATION_RE.sub(' ', name.lower())
+    name = _SPACES_RE.sub(' ', name).strip()
+    
+    # Убираем общие слова
+    return ' '.join(word for word in name.split() if word not in STOP_WORDS)
+
+def _word_bonus(words1: Set[str], words2: Set[str], common: int) -> float:
+    return common / max(len(words1), len(words2))
+
+def cleaned_similarity(clean1: str, clean2: str) -> float:
+    """Схожесть уже очищенных названий: 0.7 * SequenceMatcher + 0.3 * доля общих слов"""
+    if not clean1 or not clean2:
+        return 0
+    
+    base_similarity = SequenceMatcher(None, clean1, clean2).ratio()
+    words1 = set(clean1.split())
+    words2 = set(clean2.split())
+    
+    return min(base_similarity * 0.7 + _word_bonus(words1, words2, len(words1 & words2)) * 0.3, 1.0)
+
+def name_similarity(name1, name2):
+    """Вычисляет схожесть названий"""
+    return cleaned_similarity(clean_name(name1), clean_name(name2))
+
+
+class NameMatcher:
+    """
+    Индекс названий OpenCart: каждое название очищается и разбивается на слова один
+    раз, слова попадают в инвертированный индекс с весами IDF. Для названия GrandLine
+    кандидаты набираются по его словам от самых редких, пока суммарная длина списков
+    не превысит posting_budget, и лишь top_k кандидатов с наибольшим суммарным IDF
+    получают точную оценку name_similarity.
+    
+    Совпадение без общих слов невозможно (без них оценка не превышает 0.7 * ratio),
+    поэтому индекс теряет только пары, где общие слова есть, но все частые.
+    """
+    
+    def __init__(self, names: List[str], top_k: int = 50, posting_budget: int = 2000):
+        self.top_k = top_k
+        self.posting_budget = posting_budget
+        self.cleaned = [clean_name(name) for name in names]
+        self.words = [set(cleaned.split()) for cleaned in self.cleaned]
+        self._build_index()
+    
+    def _build_index(self):
+        index = defaultdict(list)
+        for position, words in enumerate(self.words):
+            for word in words:
+                index[word].append(position)
+        self.index = dict(index)
+        
+        total = max(1, len(self.cleaned))
+        self.idf = {word: math.log(total / len(postings)) + 1.0 for word, postings in self.index.items()}
+    
+    def _candidates(self, words: Set[str]) -> List[int]:
+        known = sorted((word for word in words if word in self.index), key=lambda word: len(self.index[word]))
+        
+        scores = defaultdict(float)
+        scanned = 0
+        for word in known:
+            posting = self.index[word]
+            if scanned and scanned + len(posting) > self.posting_budget:
+                break
+            scanned += len(posting)
+            weight = self.idf[word]
+            for position in posting:
+                scores[position] += weight
+        
+        # При равном весе раньше идет товар с меньшей позицией
+        top = heapq.nsmallest(self.top_k, scores.items(), key=lambda item: (-item[1], item[0]))
+        return sorted(map(itemgetter(0), top))
+    
+    def _rerank(self, clean: str, candidates: Iterable[int], min_similarity: float) -> Optional[Tuple[int, float]]:
+        """Точная оценка name_similarity для кандидатов (позиции по возрастанию)"""
+        words = set(clean.split())
+        bound = SequenceMatcher(None, '', clean)
+        best_position, best_score = None, 0
+        
+        for position in candidates:
+            other = self.cleaned[position]
+            bonus = _word_bonus(words, self.words[position], len(words & self.words[position]))
+            
+            # quick_ratio - верхняя граница ratio: точный расчет только если кандидат может победить
+            bound.set_seq1(other)
+            if bound.quick_ratio() * 0.7 + bonus * 0.3 <= max(best_score, min_similarity - 1e-9):
+                continue
+            
+            score = min(SequenceMatcher(None, clean, other).ratio() * 0.7 + bonus * 0.3, 1.0)
+            if score > best_score and score >= min_similarity:
+                best_position, best_score = position, score
+        
+        if best_position is None:
+            return None
+        return best_position, best_score
+    
+    def match(self, name: str, min_similarity: float = 0.7) -> Optional[Tuple[int, float]]:
+        """
+        Returns:
+            Optional[Tuple[int, float]]: Позиция лучшего названия OpenCart и схожесть
+            (при равной схожести - меньшая позиция, как при полном переборе)
+        """
+        clean = clean_name(name)
+        if not clean:
+            return None
+        return self._rerank(clean, self._candidates(set(clean.split())), min_similarity)
+    
+    def iter_matches(self, names: Iterable[str], min_similarity: float = 0.7) -> Iterator[Optional[Tuple[int, float]]]:
+        """Результаты match для каждого названия в исходном порядке"""
+        for name in names:
+            yield self.match(name, min_similarity)
+
+
+class TfidfNameMatcher(NameMatcher):
+    """
+    Векторный поиск кандидатов: очищенные названия OpenCart превращаются в TF-IDF
+    векторы символьных триграмм (разреженная матрица scipy), а названия GrandLine
+    обрабатываются блоками по block_size - косинусная близость блока со всем
+    каталогом считается одним умножением матриц. top_k ближайших по косинусу
+    получают ту же точную оценку name_similarity, что и в NameMatcher, поэтому
+    пороги схожести не меняются.
+    
+    В отличие от индекса слов, триграммы дают кандидатов и тогда, когда слова
+    совпадают лишь частично: другие формы и опечатки ("профнастила" и "профнастил").
+    """
+    
+    NGRAM = 3
+    
+    def __init__(self, names: List[str], top_k: int = 30, block_size: int = 256):
+        if np is None:
+            raise ImportError("Для TfidfNameMatcher нужны numpy и scipy")
+        
+        self.block_size = block_size
+        super().__init__(names, top_k=top_k)
+    
+    def _ngrams(self, clean: str) -> List[str]:
+        padded = f" {clean} "
+        return [padded[i:i + self.NGRAM] for i in range(len(padded) - self.NGRAM + 1)]
+    
+    def _vectorize(self, cleaned: List[str], grow: bool):
+        """Строки - нормированные TF-IDF векторы; новые триграммы добавляются в словарь только при grow"""
+        rows, columns, counts = [], [], []
+        for row, clean in enumerate(cleaned):
+            for ngram, count in Counter(self._ngrams(clean) if clean else ()).items():
+                column = self.vocabulary.get(ngram)
+                if column is None:
+                    if not grow:
+                        continue
+                    column = self.vocabulary[ngram] = len(self.vocabulary)
+                rows.append(row)
+                columns.append(column)
+                counts.append(count)
+        
+        matrix = sparse.csr_matrix(
+            (np.asarray(counts, dtype=np.float32), (rows, columns)),
+            shape=(len(cleaned), len(self.vocabulary)), dtype=np.float32
+        )
+        matrix.data = 1 + np.log(matrix.data)
+        
+        if grow:
+            document_frequency = np.bincount(matrix.indices, minlength=len(self.vocabulary))
+            self.ngram_idf = (np.log((1 + len(cleaned)) / (1 + document_frequency)) + 1).astype(np.float32)
+        
+        matrix = matrix @ sparse.diags(self.ngram_idf)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.diags(1 / norms) @ matrix
+    
+    def _build_index(self):
+        self.vocabulary = {}
+        # Транспонированная матрица каталога хранится в CSR для умножения блок @ каталог
+        self.matrix_t = self._vectorize(self.cleaned, grow=True).T.tocsr()
+    
+    def match(self, name: str, min_similarity: float = 0.7) -> Optional[Tuple[int, float]]:
+        return next(self.iter_matches([name], min_similarity))
+    
+    def iter_matches(self, names: Iterable[str], min_similarity: float = 0.7) -> Iterator[Optional[Tuple[int, float]]]:
+        names = list(names)
+        top_k = min(self.top_k, len(self.cleaned))
+        
+        for start in range(0, len(names), self.block_size):
+            cleaned = [clean_name(name) for name in names[start:start + self.block_size]]
+            if not top_k:
+                yield from (None for _ in cleaned)
+                continue
+            
+            similarities = (self._vectorize(cleaned, grow=False) @ self.matrix_t).toarray()
+            nearest = np.argpartition(-similarities, top_k - 1, axis=1)[:, :top_k]
+            
+            for row, clean in enumerate(cleaned):
+                if not clean:
+                    yield None
+                    continue
+                candidates = sorted(int(position) for position in nearest[row] if similarities[row, position] > 0)
+                yield self._rerank(clean, candidates, min_similarity)
+
+def create_name_matcher(names: List[str], backend: Optional[str] = None) -> NameMatcher:
+    """Сопоставитель названий по NAME_MATCH_BACKEND: 'index' (слова) или 'tfidf' (триграммы)"""
+    backend = (backend or Config.NAME_MATCH_BACKEND).lower()
+    
+    if backend == 'tfidf':
+        if np is not None:
+            return TfidfNameMatcher(names)
+        logger.warning("numpy/scipy не установлены, сопоставление названий идет через индекс слов")
+    elif backend != 'index':
+        logger.warning(f"Неизвестный NAME_MATCH_BACKEND: {backend}, используется индекс слов")
+    
+    return NameMatcher(names)
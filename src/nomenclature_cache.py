@@ -0,0 +1,175 @@
+"""
+Локальный кэш справочника номенклатур GrandLine (id_1c -> code_1c)
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class NomenclatureCache:
+    
+    # Ограничение SQLite на количество параметров в одном запросе
+    CHUNK_SIZE = 500
+    
+    def __init__(self, path: Optional[str] = None, ttl: Optional[int] = None):
+        self.path = path or os.path.join(Config.DOWNLOAD_DIR, 'nomenclature_cache.db')
+        self.ttl = Config.NOMENCLATURE_CACHE_TTL if ttl is None else ttl
+        self.lock = threading.Lock()
+        
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS nomenclatures (
+                id_1c TEXT PRIMARY KEY,
+                code_1c TEXT NOT NULL,
+                name TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        # id, которых не оказалось в полностью пройденном справочнике: до истечения
+        # TTL они известны как отсутствующие, и справочник ради них не обходится заново
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS absent_nomenclatures (
+                id_1c TEXT PRIMARY KEY,
+                checked_at REAL NOT NULL
+            )
+        """)
+        self.connection.commit()
+    
+    def _fresh_since(self) -> float:
+        return time.time() - self.ttl if self.ttl > 0 else 0.0
+    
+    def get_many(self, nomenclature_ids: Iterable[str]) -> Dict[str, str]:
+        """
+        Возвращает актуальные (не старше TTL) соответствия id_1c -> code_1c
+        
+        Args:
+            nomenclature_ids: Идентификаторы номенклатур
+        
+        Returns:
+            Dict[str, str]: Найденные в кэше соответствия
+        """
+        return dict(self._select_fresh(
+            "SELECT id_1c, code_1c FROM nomenclatures WHERE updated_at >= ?", nomenclature_ids
+        ))
+    
+    def get_absent(self, nomenclature_ids: Iterable[str]) -> Set[str]:
+        """Возвращает id, отмеченные отсутствующими в справочнике не раньше TTL"""
+        return {row[0] for row in self._select_fresh(
+            "SELECT id_1c FROM absent_nomenclatures WHERE checked_at >= ?", nomenclature_ids
+        )}
+    
+    def _select_fresh(self, query: str, nomenclature_ids: Iterable[str]) -> List[tuple]:
+        ids = list(nomenclature_ids)
+        rows = []
+        fresh_since = self._fresh_since()
+        
+        with self.lock:
+            for i in range(0, len(ids), self.CHUNK_SIZE):
+                chunk = ids[i:i + self.CHUNK_SIZE]
+                placeholders = ', '.join('?' * len(chunk))
+                rows.extend(self.connection.execute(
+                    f"{query} AND id_1c IN ({placeholders})", [fresh_since, *chunk]
+                ))
+        
+        return rows
+    
+    def put_many(self, items: Iterable[Dict]) -> int:
+        """
+        Сохраняет элементы справочника в формате API ({"id_1c", "code_1c", "full_name"})
+        
+        Returns:
+            int: Количество сохраненных записей
+        """
+        now = time.time()
+        rows = [
+            (item.get('id_1c'), item.get('code_1c'), item.get('full_name'), now)
+            for item in items
+            if item.get('id_1c') and item.get('code_1c')
+        ]
+        
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO nomenclatures (id_1c, code_1c, name, updated_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            # Появившиеся в справочнике id больше не отсутствующие
+            self.connection.executemany(
+                "DELETE FROM absent_nomenclatures WHERE id_1c = ?", [(row[0],) for row in rows]
+            )
+            self.connection.commit()
+        
+        return len(rows)
+    
+    def put_absent(self, nomenclature_ids: Iterable[str]) -> int:
+        """
+        Отмечает id, которых нет в полностью пройденном справочнике
+        
+        Returns:
+            int: Количество отмеченных id
+        """
+        now = time.time()
+        rows = [(nomenclature_id, now) for nomenclature_id in nomenclature_ids]
+        
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO absent_nomenclatures (id_1c, checked_at) VALUES (?, ?)", rows
+            )
+            self.connection.commit()
+        
+        return len(rows)
+    
+    def invalidate(self, nomenclature_ids: Optional[Iterable[str]] = None) -> int:
+        """
+        Удаляет записи из кэша: переданные id_1c или весь кэш, если ids не заданы
+        
+        Returns:
+            int: Количество удаленных записей
+        """
+        with self.lock:
+            if nomenclature_ids is None:
+                deleted = self.connection.execute("DELETE FROM nomenclatures").rowcount
+                self.connection.execute("DELETE FROM absent_nomenclatures")
+            else:
+                ids: List[str] = list(nomenclature_ids)
+                deleted = 0
+                for i in range(0, len(ids), self.CHUNK_SIZE):
+                    chunk = ids[i:i + self.CHUNK_SIZE]
+                    placeholders = ', '.join('?' * len(chunk))
+                    deleted += self.connection.execute(
+                        f"DELETE FROM nomenclatures WHERE id_1c IN ({placeholders})", chunk
+                    ).rowcount
+                    self.connection.execute(
+                        f"DELETE FROM absent_nomenclatures WHERE id_1c IN ({placeholders})", chunk
+                    )
+            self.connection.commit()
+        
+        logger.info(f"Из кэша номенклатур удалено записей: {deleted}")
+        return deleted
+    
+    def purge_expired(self) -> int:
+        """Удаляет записи старше TTL"""
+        if self.ttl <= 0:
+            return 0
+        
+        with self.lock:
+            deleted = self.connection.execute(
+                "DELETE FROM nomenclatures WHERE updated_at < ?", (self._fresh_since(),)
+            ).rowcount
+            deleted += self.connection.execute(
+                "DELETE FROM absent_nomenclatures WHERE checked_at < ?", (self._fresh_since(),)
+            ).rowcount
+            self.connection.commit()
+        
+        return deleted
+    
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,89 @@
+"""
+Кэш результатов разбора страниц PDF по хешу содержимого страницы
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class PDFPageCache:
+    
+    # Ограничение SQLite на количество параметров в одном запросе
+    CHUNK_SIZE = 500
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(Config.DOWNLOAD_DIR, 'pdf_page_cache.db')
+        self.lock = threading.Lock()
+        
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                page_hash TEXT PRIMARY KEY,
+                products TEXT NOT NULL,
+                used_at REAL NOT NULL
+            )
+        """)
+        self.connection.commit()
+    
+    def known(self, page_hashes: Iterable[Optional[str]]) -> Set[str]:
+        """Возвращает хеши, для которых в кэше есть результат разбора"""
+        hashes = list({page_hash for page_hash in page_hashes if page_hash})
+        found = set()
+        
+        with self.lock:
+            for i in range(0, len(hashes), self.CHUNK_SIZE):
+                chunk = hashes[i:i + self.CHUNK_SIZE]
+                placeholders = ', '.join('?' * len(chunk))
+                rows = self.connection.execute(
+                    f"SELECT page_hash FROM pages WHERE page_hash IN ({placeholders})", chunk
+                )
+                found.update(row[0] for row in rows)
+        
+        return found
+    
+    def get(self, page_hash: str) -> Optional[List[Dict]]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT products FROM pages WHERE page_hash = ?", (page_hash,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE pages SET used_at = ? WHERE page_hash = ?", (time.time(), page_hash))
+        
+        return json.loads(row[0])
+    
+    def put(self, page_hash: str, products: List[Dict]):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO pages (page_hash, products, used_at) VALUES (?, ?, ?)",
+                (page_hash, json.dumps(products, ensure_ascii=False), time.time())
+            )
+    
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+    
+    def purge_unused(self, max_age: float) -> int:
+        """Удаляет страницы, не встречавшиеся в прайсах дольше max_age секунд"""
+        with self.lock:
+            deleted = self.connection.execute(
+                "DELETE FROM pages WHERE used_at < ?", (time.time() - max_age,)
+            ).rowcount
+            self.connection.commit()
+        
+        if deleted:
+            logger.info(f"Из кэша страниц PDF удалено записей: {deleted}")
+        return deleted
+    
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -1,119 +1,270 @@
 import os
 import re
+import math
+import hashlib
 import logging
-from typing import List, Dict, Optional
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Iterator
 import PyPDF2
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
 import pandas as pd
 from config import Config
+from src.pdf_page_cache import PDFPageCache
 
 logger = logging.getLogger(__name__)
 
+# Цена в строке прайса. Примерный формат: "Название товара ... цена руб."
+PRICE_RE = re.compile(r'(\d+[,.]?\d*)\s*руб')
+
+# Толщина в формате "0.5мм", "0,5 мм", "0.45"; шаблоны проверяются по порядку.
+# Первым идет обязательная подстрока шаблона: без нее поиск не запускается
+THICKNESS_RES = [
+    ('мм', re.compile(r'(\d+[,.]?\d*)\s*мм', re.IGNORECASE)),
+    ('mm', re.compile(r'(\d+[,.]?\d*)\s*mm', re.IGNORECASE)),
+    ('толщина', re.compile(r'толщина\s*(\d+[,.]?\d*)', re.IGNORECASE)),
+    ('', re.compile(r'(\d+[,.]?\d*)\s*(?=\s|$)', re.IGNORECASE))  # число в конце или перед пробелом
+]
+
+# Ключевые слова покрытий в порядке приоритета
+COATING_KEYWORDS = [
+    'полиэстер', 'polyester', 'pe',
+    'пурал', 'pural', 'pu',
+    'пластизол', 'plastisol', 'pvc',
+    'printech', 'принтек',
+    'granite', 'гранит',
+    'velur', 'велюр',
+    'safari', 'сафари'
+]
+COATING_PRIORITY = {keyword: priority for priority, keyword in enumerate(COATING_KEYWORDS)}
+
+def _keywords_overlap(keywords: List[str]) -> bool:
+    """Может ли одно ключевое слово начинаться внутри другого"""
+    return any(
+        other.startswith(keyword[i:]) or keyword[i:].startswith(other)
+        for keyword in keywords for other in keywords for i in range(1, len(keyword))
+    )
+
+# Одна альтернация на все ключевые слова: в каждой позиции она выбирает самое
+# приоритетное из начинающихся там слов. Если слова могут перекрываться, нужен
+# просмотр вперед (находит и перекрывающиеся вхождения, но заметно медленнее)
+if _keywords_overlap(COATING_KEYWORDS):
+    COATING_RE = re.compile('(?=(' + '|'.join(map(re.escape, COATING_KEYWORDS)) + '))')
+else:
+    COATING_RE = re.compile('(' + '|'.join(map(re.escape, COATING_KEYWORDS)) + ')')
+
+# Экземпляр PDFProcessor в рабочем процессе пула, создается при первой задаче
+_worker_processor = None
+
+def _parse_pages(pdf_path: str, page_indices: List[int]) -> Dict[int, List[Dict]]:
+    """Разбор набора страниц в рабочем процессе: у каждой задачи свой PdfReader"""
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = PDFProcessor(use_page_cache=False)
+    
+    with open(pdf_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return {
+            index: _worker_processor._parse_lines(pdf_reader.pages[index].extract_text() or "")
+            for index in page_indices
+        }
+
 class PDFProcessor:
     
-    def __init__(self):
+    # Входит в хеш страницы: после изменения парсера старые результаты из кэша не берутся
+    PARSER_VERSION = '2'
+    
+    def __init__(self, use_page_cache: Optional[bool] = None):
         self.download_dir = Config.DOWNLOAD_DIR
+        use_page_cache = Config.PDF_PAGE_CACHE if use_page_cache is None else use_page_cache
+        self.page_cache = PDFPageCache() if use_page_cache else None
+        self.workers = Config.PDF_WORKERS or os.cpu_count() or 1
     
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         try:
-            text = ""
+            page_texts = []
             with open(pdf_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text += page.extract_text() + "\n"
+                for page in pdf_reader.pages:
+                    page_texts.append(page.extract_text() + "\n")
             
+            text = "".join(page_texts)
             logger.info(f"Извлечен текст из PDF: {len(text)} символов")
             return text
-            
+        
         except Exception as e:
             logger.error(f"Ошибка при извлечении текста из PDF {pdf_path}: {e}")
             return ""
     
-    def parse_metallprofil_data(self, text: str) -> List[Dict]:
-
+    def _parse_lines(self, text: str) -> List[Dict]:
         products = []
         
-        try:
-            # Разбиваем текст на строки
-            lines = text.split('\n')
+        for line in text.split('\n'):
+            # Дешевая проверка до регулярного выражения: строк без цены в прайсе много
+            if 'руб' not in line:
+                continue
             
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # Ищем строки с товарами и ценами
-                # Примерный формат: "Название товара ... цена руб."
-                price_pattern = r'(\d+[,.]?\d*)\s*руб'
-                price_match = re.search(price_pattern, line)
-                
-                if price_match:
-                    price = price_match.group(1).replace(',', '.')
-                    
-                    # Извлекаем название товара (все до цены)
-                    product_name = re.sub(price_pattern, '', line).strip()
-                    
-                    # Извлекаем характеристики товара
-                    thickness = self._extract_thickness(product_name)
-                    coating_type = self._extract_coating_type(product_name)
-                    
-                    product = {
-                        'name': product_name,
-                        'price': float(price),
-                        'thickness': thickness,
-                        'coating_type': coating_type,
-                        'source': 'metallprofil'
-                    }
-                    
-                    products.append(product)
+            line = line.strip()
+            price_match = PRICE_RE.search(line)
+            if not price_match:
+                continue
+            
+            # Название товара - строка без цены (без всех вхождений, как re.sub)
+            if PRICE_RE.search(line, price_match.end()):
+                product_name = PRICE_RE.sub('', line).strip()
+            else:
+                product_name = (line[:price_match.start()] + line[price_match.end():]).strip()
             
+            products.append({
+                'name': product_name,
+                'price': float(price_match.group(1).replace(',', '.')),
+                'thickness': self._extract_thickness(product_name),
+                'coating_type': self._extract_coating_type(product_name),
+                'source': 'metallprofil'
+            })
+        
+        return products
+    
+    def parse_metallprofil_data(self, text: str) -> List[Dict]:
+        
+        try:
+            products = self._parse_lines(text)
             logger.info(f"Извлечено {len(products)} товаров из PDF")
             return products
-            
+        
         except Exception as e:
             logger.error(f"Ошибка при парсинге данных Металлпрофиль: {e}")
             return []
     
+    def _object_digest(self, obj, memo: Dict) -> bytes:
+        """Хеш объекта PDF вместе со всем, на что он ссылается (шрифты, ToUnicode, XObject)"""
+        if isinstance(obj, IndirectObject):
+            key = (obj.idnum, obj.generation)
+            if key not in memo:
+                # Заглушка на время обхода защищает от циклических ссылок
+                memo[key] = b''
+                memo[key] = self._object_digest(obj.get_object(), memo)
+            return memo[key]
+        
+        digest = hashlib.sha1()
+        if isinstance(obj, DictionaryObject):
+            for key in sorted(obj):
+                digest.update(key.encode('utf-8'))
+                digest.update(self._object_digest(obj.raw_get(key), memo))
+            if isinstance(obj, StreamObject):
+                digest.update(obj.get_data())
+        elif isinstance(obj, ArrayObject):
+            for item in obj:
+                digest.update(self._object_digest(item, memo))
+        else:
+            digest.update(repr(obj).encode('utf-8'))
+        return digest.digest()
+    
+    def _page_hash(self, page, memo: Dict) -> str:
+        # Хешируется поток содержимого и ресурсы страницы (от шрифтов и XObject тоже
+        # зависит извлеченный текст) - это намного дешевле извлечения текста.
+        # memo - хеши общих для страниц объектов: шрифт файла хешируется один раз
+        contents = page.get_contents()
+        data = contents.get_data() if contents is not None else b''
+        resources = self._object_digest(page.raw_get('/Resources'), memo) if '/Resources' in page else b''
+        return hashlib.sha1(self.PARSER_VERSION.encode('ascii') + data + resources).hexdigest()
+    
+    @staticmethod
+    def _mp_context():
+        methods = multiprocessing.get_all_start_methods()
+        return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    
+    def _worker_count(self, pages_to_parse: int) -> int:
+        # Запуск пула процессов окупается только на больших прайсах
+        if self.workers <= 1 or pages_to_parse < Config.PDF_PARALLEL_MIN_PAGES:
+            return 1
+        return min(self.workers, pages_to_parse)
+    
+    def iter_page_products(self, pdf_path: str) -> Iterator[List[Dict]]:
+        """
+        Извлекает и разбирает PDF постранично, отдавая товары каждой страницы по мере
+        разбора. Страницы, чье содержимое не изменилось с прошлых запусков, берутся
+        из кэша без извлечения текста. Если измененных страниц много, они делятся на
+        диапазоны и разбираются в пуле процессов (PDF_WORKERS); результат все равно
+        отдается строго в порядке страниц.
+        """
+        pages_total = 0
+        cache_hits = 0
+        executor = None
+        
+        try:
+            with open(pdf_path, 'rb') as file:
+                pdf_reader = PyPDF2.PdfReader(file)
+                pages = pdf_reader.pages
+                pages_total = len(pages)
+                
+                memo = {}
+                page_hashes = [self._page_hash(page, memo) if self.page_cache else None for page in pages]
+                known_hashes = self.page_cache.known(page_hashes) if self.page_cache else set()
+                to_parse = [index for index, page_hash in enumerate(page_hashes) if page_hash not in known_hashes]
+                
+                workers = self._worker_count(len(to_parse))
+                shards = {}
+                if workers > 1:
+                    logger.info(f"Разбор {len(to_parse)} страниц PDF в {workers} процессах")
+                    # Синхронизация идет в потоке планировщика рядом с другими потоками:
+                    # fork многопоточного процесса может унаследовать захваченные блокировки
+                    executor = ProcessPoolExecutor(max_workers=workers, mp_context=self._mp_context())
+                    # Несколько диапазонов на процесс, чтобы сгладить разную сложность страниц
+                    shard_size = math.ceil(len(to_parse) / (workers * 4))
+                    for start in range(0, len(to_parse), shard_size):
+                        shard = to_parse[start:start + shard_size]
+                        future = executor.submit(_parse_pages, pdf_path, shard)
+                        for index in shard:
+                            shards[index] = future
+                
+                for index, page in enumerate(pages):
+                    page_hash = page_hashes[index]
+                    products = self.page_cache.get(page_hash) if page_hash in known_hashes else None
+                    
+                    if products is not None:
+                        cache_hits += 1
+                    else:
+                        if index in shards:
+                            products = shards.pop(index).result()[index]
+                        else:
+                            products = self._parse_lines(page.extract_text() or "")
+                        if page_hash:
+                            self.page_cache.put(page_hash, products)
+                    
+                    yield products
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+            if self.page_cache:
+                self.page_cache.commit()
+            logger.info(f"Обработано страниц PDF: {pages_total}, из кэша: {cache_hits}")
+    
     def _extract_thickness(self, product_name: str) -> Optional[str]:
-
-        # Ищем толщину в формате "0.5мм", "0,5 мм", "0.45"
-        thickness_patterns = [
-            r'(\d+[,.]?\d*)\s*мм',
-            r'(\d+[,.]?\d*)\s*mm',
-            r'толщина\s*(\d+[,.]?\d*)',
-            r'(\d+[,.]?\d*)\s*(?=\s|$)'  # число в конце или перед пробелом
-        ]
-        
-        for pattern in thickness_patterns:
-            match = re.search(pattern, product_name, re.IGNORECASE)
+        
+        product_lower = product_name.lower()
+        
+        for marker, pattern in THICKNESS_RES:
+            if marker not in product_lower:
+                continue
+            match = pattern.search(product_name)
             if match:
                 return match.group(1).replace(',', '.')
         
         return None
     
     def _extract_coating_type(self, product_name: str) -> Optional[str]:
-
-        coating_keywords = [
-            'полиэстер', 'polyester', 'pe',
-            'пурал', 'pural', 'pu',
-            'пластизол', 'plastisol', 'pvc',
-            'printech', 'принтек',
-            'granite', 'гранит',
-            'velur', 'велюр',
-            'safari', 'сафари'
-        ]
-        
-        product_lower = product_name.lower()
         
-        for keyword in coating_keywords:
-            if keyword in product_lower:
-                return keyword.title()
+        # Из всех найденных ключевых слов берется самое приоритетное
+        found = COATING_RE.findall(product_name.lower())
+        if not found:
+            return None
         
-        return None
+        return min(found, key=COATING_PRIORITY.__getitem__).title()
     
     def filter_products_by_rules(self, products: List[Dict], rules: Dict) -> List[Dict]:
-
+        
         filtered_products = []
         
         try:
@@ -124,13 +275,13 @@ class PDFProcessor:
             
             logger.info(f"После фильтрации осталось {len(filtered_products)} товаров")
             return filtered_products
-            
+        
         except Exception as e:
             logger.error(f"Ошибка при фильтрации товаров: {e}")
             return products
     
     def _matches_rules(self, product: Dict, rules: Dict) -> bool:
-
+        
         # Проверка толщины
         if 'thickness_range' in rules:
             thickness = product.get('thickness')
@@ -167,7 +318,7 @@ class PDFProcessor:
         return True
     
     def save_to_excel(self, products: List[Dict], filename: str) -> str:
-
+        
         try:
             df = pd.DataFrame(products)
             
@@ -179,13 +330,13 @@ class PDFProcessor:
             
             logger.info(f"Данные сохранены в Excel: {file_path}")
             return file_path
-            
+        
         except Exception as e:
             logger.error(f"Ошибка при сохранении в Excel: {e}")
             raise
     
     def save_to_csv(self, products: List[Dict], filename: str) -> str:
-
+        
         try:
             df = pd.DataFrame(products)
             
@@ -197,24 +348,25 @@ class PDFProcessor:
             
             logger.info(f"Данные сохранены в CSV: {file_path}")
             return file_path
-            
+        
         except Exception as e:
             logger.error(f"Ошибка при сохранении в CSV: {e}")
             raise
     
     def process_pdf_file(self, pdf_path: str, rules: Optional[Dict] = None) -> List[Dict]:
-
+        
         try:
             logger.info(f"Начало обработки PDF файла: {pdf_path}")
             
-            # Извлекаем текст
-            text = self.extract_text_from_pdf(pdf_path)
-            if not text:
-                logger.error("Не удалось извлечь текст из PDF")
-                return []
+            # Извлекаем и парсим данные постранично
+            products = []
+            for page_products in self.iter_page_products(pdf_path):
+                products.extend(page_products)
             
-            # Парсим данные
-            products = self.parse_metallprofil_data(text)
+            if self.page_cache:
+                self.page_cache.purge_unused(Config.PDF_PAGE_CACHE_MAX_AGE)
+            
+            logger.info(f"Извлечено {len(products)} товаров из PDF")
             if not products:
                 logger.warning("Не найдено товаров в PDF")
                 return []
@@ -225,7 +377,7 @@ class PDFProcessor:
             
             logger.info(f"Обработка PDF завершена. Получено {len(products)} товаров")
             return products
-            
+        
         except Exception as e:
             logger.error(f"Ошибка при обработке PDF файла: {e}")
             return []
@@ -0,0 +1,103 @@
+"""
+Конвейер обработки: стадии в отдельных потоках, связанные ограниченными очередями
+"""
+import queue
+import logging
+import threading
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Маркер конца потока данных между стадиями
+_DONE = object()
+
+class Pipeline:
+    """
+    Каждая стадия - функция, принимающая итератор элементов предыдущей стадии и
+    отдающая свои элементы. Каждая стадия работает в своем потоке, очередь между
+    стадиями ограничена queue_size элементами: быстрая стадия ждет медленную, и в
+    памяти находится не больше нескольких страниц на стадию. Код, итерирующий
+    конвейер, получает результаты последней стадии как отдельный потребитель.
+    Ошибка любой стадии останавливает весь конвейер и пробрасывается вызывающему коду.
+    """
+    
+    # Как часто заблокированная стадия проверяет сигнал остановки (сек)
+    POLL_INTERVAL = 0.2
+    
+    def __init__(self, source: Iterable, queue_size: int = 4, name: str = 'pipeline'):
+        self.source = source
+        self.queue_size = max(1, queue_size)
+        self.name = name
+        self.stages: List[Tuple[str, Callable[[Iterator], Iterator]]] = []
+        self._stop = threading.Event()
+        self._errors: List[Exception] = []
+    
+    def stage(self, name: str, transform: Callable[[Iterator], Iterator]) -> 'Pipeline':
+        self.stages.append((name, transform))
+        return self
+    
+    def _put(self, output: queue.Queue, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                output.put(item, timeout=self.POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _drain(self, input_queue: queue.Queue) -> Iterator:
+        while not self._stop.is_set():
+            try:
+                item = input_queue.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            yield item
+    
+    def _run_stage(self, name: str, items: Iterator, output: queue.Queue):
+        try:
+            for item in items:
+                if not self._put(output, item):
+                    break
+        except Exception as e:
+            logger.error(f"Ошибка на стадии {self.name}/{name}: {e}")
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            close = getattr(items, 'close', None)
+            if close:
+                close()
+            self._put(output, _DONE)
+    
+    def __iter__(self) -> Iterator:
+        self._stop.clear()
+        self._errors.clear()
+        
+        threads = []
+        items: Iterator = iter(self.source)
+        name = 'source'
+        
+        for stage_name, transform in [*self.stages, (None, None)]:
+            output = queue.Queue(maxsize=self.queue_size)
+            thread = threading.Thread(
+                target=self._run_stage, args=(name, items, output),
+                name=f"{self.name}-{name}", daemon=True
+            )
+            threads.append(thread)
+            items = transform(self._drain(output)) if transform else self._drain(output)
+            name = stage_name
+        
+        for thread in threads:
+            thread.start()
+        
+        try:
+            yield from items
+        finally:
+            # Ранний выход или ошибка потребителя: останавливаем стадии выше по потоку
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+        
+        if self._errors:
+            raise self._errors[0]
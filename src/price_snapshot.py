@@ -0,0 +1,122 @@
+"""
+Снимок последних успешно записанных цен (code_1c -> хеш, цена) для дельта-синхронизации
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class PriceSnapshot:
+    
+    def __init__(self, source: str, path: Optional[str] = None):
+        self.source = source
+        self.path = path or Config.PRICE_SNAPSHOT_FILE or os.path.join(Config.DOWNLOAD_DIR, 'price_snapshot.db')
+        self.lock = threading.Lock()
+        
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS prices (
+                source TEXT NOT NULL,
+                code_1c TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                price REAL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (source, code_1c)
+            )
+        """)
+        self.connection.commit()
+    
+    @staticmethod
+    def _row_hash(update: Dict) -> str:
+        # В хеш входят все поля обновления (цена, скидки), а не только цена
+        return hashlib.sha1(json.dumps(update, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    
+    def load(self) -> Dict[str, str]:
+        """Возвращает зафиксированный снимок источника: code_1c -> хеш"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT code_1c, hash FROM prices WHERE source = ?", (self.source,)
+            )
+            return dict(rows)
+    
+    def changed(self, price_updates: List[Dict], previous: Dict[str, str]) -> List[Dict]:
+        """Отбирает новые и изменившиеся относительно снимка previous обновления"""
+        return [
+            update for update in price_updates
+            if update.get('code_1c') and previous.get(update['code_1c']) != self._row_hash(update)
+        ]
+    
+    def diff(self, price_updates: List[Dict]) -> Tuple[List[Dict], List[str]]:
+        """
+        Сравнивает текущий прайс с последним зафиксированным снимком
+        
+        Args:
+            price_updates: Полный список обновлений [{"code_1c": "...", "price": ...}]
+        
+        Returns:
+            Tuple[List[Dict], List[str]]: Новые и изменившиеся обновления; коды,
+            пропавшие из прайса с прошлого запуска
+        """
+        previous = self.load()
+        changes = self.changed(price_updates, previous)
+        current_codes = {update.get('code_1c') for update in price_updates}
+        removed = [code_1c for code_1c in previous if code_1c not in current_codes]
+        
+        logger.info(f"Дельта относительно снимка: изменено {len(changes)} из {len(price_updates)}, "
+                    f"удалено из прайса: {len(removed)}")
+        return changes, removed
+    
+    def commit(self, price_updates: List[Dict], removed: Iterable[str] = (),
+               failed_codes: Iterable[str] = ()) -> int:
+        """
+        Фиксирует успешно записанные цены в снимке
+        
+        Коды из failed_codes удаляются из снимка, чтобы следующий запуск отправил
+        их снова; пропавшие из прайса коды (removed) тоже удаляются.
+        
+        Returns:
+            int: Количество записей, сохраненных в снимок
+        """
+        failed = set(failed_codes)
+        now = time.time()
+        rows = [
+            (self.source, update['code_1c'], self._row_hash(update), float(update['price']), now)
+            for update in price_updates
+            if update.get('code_1c') and update['code_1c'] not in failed
+        ]
+        stale = [(self.source, code_1c) for code_1c in (*failed, *removed)]
+        
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO prices (source, code_1c, hash, price, updated_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self.connection.executemany("DELETE FROM prices WHERE source = ? AND code_1c = ?", stale)
+            self.connection.commit()
+        
+        return len(rows)
+    
+    def reset(self) -> int:
+        """Очищает снимок источника: следующий запуск отправит прайс целиком"""
+        with self.lock:
+            deleted = self.connection.execute(
+                "DELETE FROM prices WHERE source = ?", (self.source,)
+            ).rowcount
+            self.connection.commit()
+        
+        logger.info(f"Снимок цен {self.source} очищен, удалено записей: {deleted}")
+        return deleted
+    
+    def close(self):
+        with self.lock:
+            self.connection.close()
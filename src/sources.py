@@ -0,0 +1,210 @@
+"""
+Реестр источников цен и параллельный планировщик их синхронизации
+"""
+import time
+import logging
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class Source(ABC):
+    """
+    Источник в реестре и планировщике. priority - порядок запуска (меньше - раньше),
+    timeout - лимит времени синхронизации от ее фактического старта в секундах
+    (0 - без ограничения), concurrency_group - общий ресурс (например 'browser'),
+    число одновременных синхронизаций которого ограничено.
+    """
+    
+    name = ''
+    priority = 100
+    timeout = 0
+    concurrency_group: Optional[str] = None
+    
+    @abstractmethod
+    def sync(self) -> bool:
+        """Синхронизирует цены источника, True - если что-то обновлено"""
+
+
+class PriceSource(Source):
+    """
+    Источник цен поставщика. Синхронизация: fetch -> normalize -> map -> publish.
+    Новый поставщик реализует fetch (загрузка данных) и publish (запись результата),
+    при необходимости normalize (приведение к списку позиций) и map (сопоставление
+    с кодами 1С, результат [{"code_1c": ..., "price": ...}]).
+    """
+    
+    @abstractmethod
+    def fetch(self) -> Any:
+        pass
+    
+    def normalize(self, raw: Any) -> List[Dict]:
+        return raw
+    
+    def map(self, records: List[Dict]) -> List[Dict]:
+        return records
+    
+    @abstractmethod
+    def publish(self, updates: List[Dict]) -> bool:
+        pass
+    
+    def sync(self) -> bool:
+        raw = self.fetch()
+        if not raw:
+            logger.warning(f"Источник {self.name} не вернул данных")
+            return False
+        
+        updates = self.map(self.normalize(raw))
+        if not updates:
+            logger.warning(f"Источник {self.name}: нет позиций для обновления после сопоставления")
+            return False
+        
+        return self.publish(updates)
+
+
+class CallableSource(Source):
+    """Обертка над готовой функцией синхронизации (встроенные источники со своим потоком)"""
+    
+    def __init__(self, name: str, sync: Callable[[], bool], priority: int = 100,
+                 timeout: int = 0, concurrency_group: Optional[str] = None):
+        self.name = name
+        self.priority = priority
+        self.timeout = timeout
+        self.concurrency_group = concurrency_group
+        self._sync = sync
+    
+    def sync(self) -> bool:
+        return self._sync()
+
+
+class SourceRegistry:
+    
+    def __init__(self):
+        self._sources: Dict[str, Source] = {}
+    
+    def register(self, source: Source) -> Source:
+        if not source.name:
+            raise ValueError("У источника не задано имя")
+        if source.name in self._sources:
+            raise ValueError(f"Источник {source.name} уже зарегистрирован")
+        
+        self._sources[source.name] = source
+        logger.info(f"Зарегистрирован источник цен: {source.name} (приоритет {source.priority})")
+        return source
+    
+    def unregister(self, name: str):
+        self._sources.pop(name, None)
+    
+    def get(self, name: str) -> Optional[Source]:
+        return self._sources.get(name)
+    
+    def sources(self) -> List[Source]:
+        """Источники в порядке приоритета"""
+        return sorted(self._sources.values(), key=lambda source: source.priority)
+    
+    def __len__(self) -> int:
+        return len(self._sources)
+
+
+def parse_group_limits(value: Optional[str]) -> Dict[str, int]:
+    """Разбирает строку вида 'browser:1,api:4' в {'browser': 1, 'api': 4}"""
+    limits = {}
+    for part in (value or '').split(','):
+        if ':' not in part:
+            continue
+        group, limit = part.split(':', 1)
+        try:
+            limits[group.strip()] = max(1, int(limit))
+        except ValueError:
+            logger.warning(f"Некорректный лимит группы источников: {part}")
+    return limits
+
+
+class SourceScheduler:
+    """
+    Запускает синхронизацию источников в пуле потоков в порядке приоритета.
+    Источники одной concurrency_group ограничены лимитом группы. Срок источника
+    (timeout) отсчитывается от старта его синхронизации, а не от начала запуска:
+    ожидание свободного потока в очередь не входит, ожидание лимита группы
+    ограничено тем же timeout. Источник, не уложившийся в срок, считается
+    неуспешным, его поток дорабатывает в фоне, и до его завершения источник
+    повторно не запускается. Ошибка одного источника не влияет на остальные.
+    """
+    
+    # Период проверки сроков работающих источников (сек)
+    POLL_INTERVAL = 0.2
+    
+    def __init__(self, max_workers: Optional[int] = None, group_limits: Optional[Dict[str, int]] = None):
+        self.max_workers = max(1, max_workers or Config.SYNC_MAX_WORKERS)
+        limits = parse_group_limits(Config.SYNC_GROUP_LIMITS) if group_limits is None else group_limits
+        self._group_semaphores = {group: threading.Semaphore(limit) for group, limit in limits.items()}
+        self._running: Dict[str, Future] = {}
+    
+    def _run_source(self, source: Source, started_at: Dict[str, float]) -> bool:
+        semaphore = self._group_semaphores.get(source.concurrency_group)
+        if semaphore is None:
+            started_at[source.name] = time.monotonic()
+            return source.sync()
+        
+        if not semaphore.acquire(timeout=source.timeout if source.timeout > 0 else None):
+            logger.error(f"Синхронизация {source.name} не дождалась лимита группы "
+                         f"{source.concurrency_group} за {source.timeout} сек")
+            return False
+        try:
+            started_at[source.name] = time.monotonic()
+            return source.sync()
+        finally:
+            semaphore.release()
+    
+    def run(self, sources: List[Source]) -> Dict[str, bool]:
+        results = {source.name: False for source in sources}
+        started = time.monotonic()
+        started_at: Dict[str, float] = {}
+        pending: Dict[Future, Source] = {}
+        
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='source')
+        
+        for source in sorted(sources, key=lambda source: source.priority):
+            running = self._running.get(source.name)
+            if running and not running.done():
+                logger.error(f"Предыдущая синхронизация {source.name} еще не завершилась, пропуск")
+                continue
+            pending[executor.submit(self._run_source, source, started_at)] = source
+        
+        # Потоки пула, занятые синхронизациями, которые не уложились в срок
+        hung = 0
+        while pending:
+            done, _ = wait(pending, timeout=self.POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                source = pending.pop(future)
+                try:
+                    results[source.name] = bool(future.result())
+                except Exception as e:
+                    logger.error(f"Критическая ошибка синхронизации {source.name}: {e}")
+            
+            now = time.monotonic()
+            for future, source in list(pending.items()):
+                source_started = started_at.get(source.name)
+                if source_started is None:
+                    # Все потоки заняты зависшими синхронизациями - источник не запустится никогда
+                    if hung >= self.max_workers and future.cancel():
+                        logger.error(f"Синхронизация {source.name} не запущена: все потоки заняты "
+                                     f"синхронизациями, не уложившимися в срок")
+                        del pending[future]
+                    continue
+                
+                if source.timeout > 0 and now - source_started > source.timeout:
+                    logger.error(f"Синхронизация {source.name} не уложилась в {source.timeout} сек")
+                    self._running[source.name] = future
+                    del pending[future]
+                    hung += 1
+        
+        # Зависшие синхронизации не ждем, их потоки завершатся сами
+        executor.shutdown(wait=False)
+        
+        logger.info(f"Синхронизация источников завершена за {time.monotonic() - started:.1f} сек: "
+                    f"успешно {sum(results.values())} из {len(results)}")
+        return results
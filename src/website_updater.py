@@ -1,17 +1,64 @@
-import requests
+import json
+import gzip
+import time
+import random
 import logging
-from typing import List, Dict, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
 from config import Config
 
 logger = logging.getLogger(__name__)
 
-class WebsiteUpdater:
+class CircuitBreaker:
+    """Размыкается после threshold подряд идущих отказов сервера (5xx, таймауты, обрывы)"""
+    
+    def __init__(self, threshold: int):
+        self.threshold = max(1, threshold)
+        self.consecutive_failures = 0
+        self.is_open = False
+        self.lock = threading.Lock()
+    
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+    
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if not self.is_open and self.consecutive_failures >= self.threshold:
+                self.is_open = True
+                logger.error(f"Сайт вернул {self.consecutive_failures} отказов подряд, "
+                             f"оставшиеся обновления пропускаются")
 
+class WebsiteUpdater:
+    
     def __init__(self):
         self.api_url = Config.WEBSITE_API_URL
         self.api_key = Config.WEBSITE_API_KEY
+        self.timeout = Config.WEBSITE_TIMEOUT
+        self.batch_size = Config.WEBSITE_BATCH_SIZE
+        self.min_batch_size = Config.WEBSITE_MIN_BATCH_SIZE
+        self.max_batch_size = Config.WEBSITE_MAX_BATCH_SIZE
+        self.target_latency = Config.WEBSITE_TARGET_LATENCY
+        self.max_in_flight = max(1, Config.WEBSITE_MAX_IN_FLIGHT)
+        self.max_retries = max(1, Config.WEBSITE_MAX_RETRIES)
+        self.retry_backoff = Config.WEBSITE_RETRY_BACKOFF
+        self.individual_concurrency = max(1, Config.WEBSITE_INDIVIDUAL_CONCURRENCY)
+        self.circuit_breaker_threshold = Config.WEBSITE_CIRCUIT_BREAKER_THRESHOLD
+        self.payload_format = Config.WEBSITE_PAYLOAD_FORMAT
+        self.gzip_payload = Config.WEBSITE_GZIP
         self.session = requests.Session()
         
+        # Пул соединений не меньше числа параллельных запросов, иначе urllib3
+        # будет закрывать лишние соединения и заново делать TLS handshake
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=max(self.max_in_flight, self.individual_concurrency))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
         # Настройка заголовков
         if self.api_key:
             self.session.headers.update({
@@ -20,7 +67,8 @@ class WebsiteUpdater:
             })
     
     def update_single_price(self, code_1c: str, price: str, discount: Optional[str] = None, 
-                           discount_price: Optional[str] = None) -> bool:
+                           discount_price: Optional[str] = None,
+                           circuit_breaker: Optional[CircuitBreaker] = None) -> bool:
         try:
             url = f"{self.api_url}/products/{code_1c}/price"
             
@@ -36,21 +84,111 @@ class WebsiteUpdater:
                 data['discount_price'] = discount_price
             
             logger.debug(f"Обновление цены для {code_1c}: {price}")
-            response = self.session.put(url, json=data)
+            response = self.session.put(url, json=data, timeout=self.timeout)
             response.raise_for_status()
             
+            if circuit_breaker:
+                circuit_breaker.record_success()
+            
             logger.info(f"Цена успешно обновлена для {code_1c}")
             return True
-            
+        
         except requests.exceptions.RequestException as e:
             logger.error(f"Ошибка при обновлении цены для {code_1c}: {e}")
+            if circuit_breaker:
+                if self._is_server_failure(e):
+                    circuit_breaker.record_failure()
+                else:
+                    circuit_breaker.record_success()
             return False
         except Exception as e:
             logger.error(f"Неожиданная ошибка при обновлении {code_1c}: {e}")
             return False
     
+    @staticmethod
+    def _is_server_failure(error: requests.exceptions.RequestException) -> bool:
+        response = getattr(error, 'response', None)
+        return response is None or response.status_code >= 500
+    
+    @staticmethod
+    def _is_retryable(error: requests.exceptions.RequestException) -> bool:
+        response = getattr(error, 'response', None)
+        # Таймауты и обрывы соединения, 5xx и 429 - временные; прочие 4xx повторять бессмысленно
+        return response is None or response.status_code >= 500 or response.status_code == 429
+    
+    def _encode_batch(self, batch: List[Dict]) -> Tuple[bytes, Dict[str, str], int]:
+        """
+        Кодирует батч для отправки. Формат 'rows' - {'updates': [{...}, ...]} как раньше,
+        'columnar' - {'codes': [...], 'prices': [...]} с числовыми ценами без повторения
+        имен ключей. Скидки добавляются колонками только если есть хотя бы у одной позиции.
+        Позиции с ценой, которую нельзя привести к числу, в колоночный батч не попадают.
+        
+        Returns:
+            Tuple[bytes, Dict[str, str], int]: Тело, заголовки и число пропущенных позиций
+        """
+        skipped = 0
+        if self.payload_format == 'columnar':
+            rows = []
+            for update in batch:
+                try:
+                    rows.append((update, float(str(update.get('price')).replace(',', '.'))))
+                except (TypeError, ValueError):
+                    logger.warning(f"Пропущено обновление для {update.get('code_1c')}: некорректный формат цены")
+                    skipped += 1
+            
+            payload = {
+                'codes': [update.get('code_1c') for update, _ in rows],
+                'prices': [price for _, price in rows]
+            }
+            for field, column in (('discount', 'discounts'), ('discountPrice', 'discount_prices')):
+                if any(update.get(field) for update, _ in rows):
+                    payload[column] = [update.get(field) for update, _ in rows]
+        else:
+            payload = {'updates': batch}
+        
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        
+        if self.gzip_payload:
+            body = gzip.compress(body, compresslevel=6)
+            headers['Content-Encoding'] = 'gzip'
+        
+        return body, headers, skipped
+    
+    def _push_batch(self, url: str, batch: List[Dict]) -> Tuple[int, int, float]:
+        body, headers, skipped = self._encode_batch(batch)
+        sent = len(batch) - skipped
+        if not sent:
+            return 0, skipped, 0.0
+        
+        started = time.monotonic()
+        response = self.session.put(url, data=body, headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+        latency = time.monotonic() - started
+        
+        try:
+            result = response.json()
+        except ValueError:
+            # Сервер уже принял батч (2xx): повтор записал бы его второй раз
+            logger.warning(f"Некорректный ответ сервера на батч ({response.status_code}), "
+                           f"батч считается примененным")
+            return sent, skipped, latency
+        return result.get('success_count', sent), result.get('failed_count', 0) + skipped, latency
+    
+    def _adapt_batch_size(self, batch_size: int, latency: float) -> int:
+        """Размер батча подстраивается под наблюдаемую задержку (AIMD)"""
+        if latency > self.target_latency:
+            return max(self.min_batch_size, batch_size // 2)
+        if latency < self.target_latency / 2:
+            return min(self.max_batch_size, batch_size + max(1, batch_size // 4))
+        return batch_size
+    
     def update_prices_batch(self, price_updates: List[Dict]) -> Dict[str, int]:
-
+        """
+        Массовое обновление цен: до WEBSITE_MAX_IN_FLIGHT батчей одновременно,
+        с таймаутом на запрос и повтором только упавших батчей (экспоненциальная
+        задержка с джиттером). Размер следующих батчей подстраивается под задержку.
+        """
         stats = {"success": 0, "failed": 0}
         
         try:
@@ -58,64 +196,119 @@ class WebsiteUpdater:
             
             logger.info(f"Начало массового обновления {len(price_updates)} цен")
             
-            # Отправляем батчами по 100 товаров
-            batch_size = 100
+            batch_size = self.batch_size
+            position = 0
+            batch_number = 0
+            # (время готовности, попытка, номер батча, батч)
+            retries = []
+            in_flight = {}
             
-            for i in range(0, len(price_updates), batch_size):
-                batch = price_updates[i:i + batch_size]
-                
-                try:
-                    response = self.session.put(url, json={'updates': batch})
-                    response.raise_for_status()
+            with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix='website') as executor:
+                while position < len(price_updates) or retries or in_flight:
+                    now = time.monotonic()
+                    
+                    while len(in_flight) < self.max_in_flight:
+                        retries.sort(key=lambda item: item[0])
+                        if retries and retries[0][0] <= now:
+                            _, attempt, number, batch = retries.pop(0)
+                        elif position < len(price_updates):
+                            batch = price_updates[position:position + batch_size]
+                            position += len(batch)
+                            batch_number += 1
+                            attempt, number = 0, batch_number
+                        else:
+                            break
+                        
+                        future = executor.submit(self._push_batch, url, batch)
+                        in_flight[future] = (attempt, number, batch)
                     
-                    result = response.json()
-                    batch_success = result.get('success_count', len(batch))
-                    batch_failed = result.get('failed_count', 0)
+                    # Срок повтора важен, только пока есть свободный слот: при занятых
+                    # слотах готовый повтор все равно ждет завершения одного из запросов
+                    next_retry = min((item[0] for item in retries), default=None)
+                    if next_retry is None or len(in_flight) >= self.max_in_flight:
+                        wait_timeout = None
+                    else:
+                        wait_timeout = max(0.0, next_retry - now)
                     
-                    stats["success"] += batch_success
-                    stats["failed"] += batch_failed
+                    if not in_flight:
+                        time.sleep(wait_timeout or 0)
+                        continue
                     
-                    logger.info(f"Батч {i//batch_size + 1}: успешно {batch_success}, ошибок {batch_failed}")
+                    done, _ = wait(in_flight, timeout=wait_timeout, return_when=FIRST_COMPLETED)
                     
-                except requests.exceptions.RequestException as e:
-                    logger.error(f"Ошибка при обновлении батча {i//batch_size + 1}: {e}")
-                    stats["failed"] += len(batch)
+                    for future in done:
+                        attempt, number, batch = in_flight.pop(future)
+                        
+                        try:
+                            batch_success, batch_failed, latency = future.result()
+                        except requests.exceptions.RequestException as e:
+                            if self._is_retryable(e) and attempt + 1 < self.max_retries:
+                                delay = self.retry_backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                                logger.warning(f"Ошибка при обновлении батча {number}: {e}, "
+                                               f"повтор через {delay:.1f} сек (попытка {attempt + 2}/{self.max_retries})")
+                                retries.append((time.monotonic() + delay, attempt + 1, number, batch))
+                            else:
+                                logger.error(f"Ошибка при обновлении батча {number}: {e}")
+                                stats["failed"] += len(batch)
+                            continue
+                        
+                        stats["success"] += batch_success
+                        stats["failed"] += batch_failed
+                        batch_size = self._adapt_batch_size(batch_size, latency)
+                        
+                        logger.info(f"Батч {number}: успешно {batch_success}, ошибок {batch_failed} "
+                                    f"({latency:.2f} сек, следующий размер {batch_size})")
             
             logger.info(f"Массовое обновление завершено. Успешно: {stats['success']}, ошибок: {stats['failed']}")
             return stats
-            
+        
         except Exception as e:
             logger.error(f"Критическая ошибка при массовом обновлении: {e}")
             stats["failed"] = len(price_updates)
             return stats
     
     def update_prices_individually(self, price_updates: List[Dict]) -> Dict[str, int]:
-
+        """
+        Поштучное обновление цен пулом из WEBSITE_INDIVIDUAL_CONCURRENCY потоков.
+        После WEBSITE_CIRCUIT_BREAKER_THRESHOLD отказов сервера подряд оставшиеся
+        обновления не отправляются и считаются неуспешными.
+        """
         stats = {"success": 0, "failed": 0}
         
         logger.info(f"Начало индивидуального обновления {len(price_updates)} цен")
         
+        valid_updates = []
         for update in price_updates:
-            code_1c = update.get('code_1c')
-            price = update.get('price')
-            discount = update.get('discount')
-            discount_price = update.get('discountPrice')
-            
-            if not code_1c or not price:
+            if not update.get('code_1c') or not update.get('price'):
                 logger.warning(f"Пропущено обновление: отсутствует code_1c или price")
                 stats["failed"] += 1
                 continue
-            
-            if self.update_single_price(code_1c, price, discount, discount_price):
-                stats["success"] += 1
-            else:
-                stats["failed"] += 1
+            valid_updates.append(update)
+        
+        circuit_breaker = CircuitBreaker(self.circuit_breaker_threshold)
+        
+        def update_one(update: Dict) -> bool:
+            if circuit_breaker.is_open:
+                return False
+            return self.update_single_price(update.get('code_1c'), update.get('price'),
+                                            update.get('discount'), update.get('discountPrice'),
+                                            circuit_breaker=circuit_breaker)
+        
+        with ThreadPoolExecutor(max_workers=self.individual_concurrency, thread_name_prefix='website') as executor:
+            for success in executor.map(update_one, valid_updates):
+                if success:
+                    stats["success"] += 1
+                else:
+                    stats["failed"] += 1
+        
+        if circuit_breaker.is_open:
+            logger.error("Индивидуальное обновление прервано: сайт недоступен")
         
         logger.info(f"Индивидуальное обновление завершено. Успешно: {stats['success']}, ошибок: {stats['failed']}")
         return stats
     
     def update_prices(self, price_updates: List[Dict], use_batch: bool = True) -> Dict[str, int]:
-
+        
         if not price_updates:
             logger.warning("Нет данных для обновления цен")
             return {"success": 0, "failed": 0}
@@ -126,7 +319,7 @@ class WebsiteUpdater:
             return self.update_prices_individually(price_updates)
     
     def test_connection(self) -> bool:
-
+        
         try:
             url = f"{self.api_url}/health"
             response = self.session.get(url, timeout=10)
@@ -134,26 +327,26 @@ class WebsiteUpdater:
             
             logger.info("Соединение с API сайта успешно")
             return True
-            
+        
         except Exception as e:
             logger.error(f"Ошибка соединения с API сайта: {e}")
             return False
     
     def get_product_info(self, code_1c: str) -> Optional[Dict]:
-
+        
         try:
             url = f"{self.api_url}/products/{code_1c}"
             response = self.session.get(url)
             response.raise_for_status()
             
             return response.json()
-            
+        
         except requests.exceptions.RequestException as e:
             logger.error(f"Ошибка при получении информации о товаре {code_1c}: {e}")
             return None
     
     def validate_price_updates(self, price_updates: List[Dict]) -> List[Dict]:
-
+        
         valid_updates = []
         
         for update in price_updates:
@@ -178,7 +371,7 @@ class WebsiteUpdater:
                 
                 # Нормализуем цену
                 update['price'] = str(price_float)
-                
+            
             except ValueError:
                 logger.warning(f"Пропущено обновление для {code_1c}: некорректный формат цены")
                 continue